@@ -0,0 +1,260 @@
+import asyncio
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any
+
+from storage import get_event_storage
+from verification_storage import get_verification_storage
+
+# Um executor de thread única por arquivo: as operações de cada arquivo
+# rodam fora do event loop e na mesma ordem em que foram chamadas
+_executors: Dict[str, ThreadPoolExecutor] = {}
+# Um group commit por arquivo (ver GroupCommitter)
+_committers: Dict[str, "GroupCommitter"] = {}
+
+# Janela do group commit em milissegundos (0 desativa)
+GROUP_COMMIT_WINDOW = float(os.getenv("STORAGE_GROUP_COMMIT_MS", 200)) / 1000
+
+
+def _executor_for(filename: str) -> ThreadPoolExecutor:
+    """Retorna o executor dedicado ao arquivo informado"""
+    key = os.path.abspath(filename)
+    if key not in _executors:
+        _executors[key] = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix=f"storage-{os.path.basename(filename)}")
+    return _executors[key]
+
+
+class GroupCommitter:
+    """Agrupa as gravações que chegam dentro de uma janela de tempo
+
+    Cada chamada entra na fila do lote atual; ao fim da janela todas são
+    aplicadas dentro de storage.batch(), que grava o arquivo uma única vez
+    (temp + fsync + rename). O future de cada chamador só é resolvido depois
+    que a gravação do lote terminou.
+    """
+
+    def __init__(self, storage, executor: ThreadPoolExecutor, window: float):
+        self.storage = storage
+        self.executor = executor
+        self.window = window
+        self._pending: List[tuple] = []
+        self._flush_task: asyncio.Task | None = None
+        self.operacoes = 0
+        self.gravacoes = 0
+
+    async def submit(self, method_name: str, *args):
+        """Enfileira uma operação de escrita e aguarda a gravação do lote"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((method_name, args, future))
+        if self._flush_task is None:
+            self._flush_task = loop.create_task(self._flush_after_window())
+        return await future
+
+    async def _flush_after_window(self):
+        await asyncio.sleep(self.window)
+        lote, self._pending = self._pending, []
+        self._flush_task = None
+        loop = asyncio.get_running_loop()
+        try:
+            resultados = await loop.run_in_executor(self.executor,
+                                                    self._apply_batch, lote)
+        except Exception as e:
+            print(f"Erro ao gravar lote de {len(lote)} operações: {e}")
+            resultados = [False] * len(lote)
+        self.operacoes += len(lote)
+        self.gravacoes += 1
+        for (_, _, future), resultado in zip(lote, resultados):
+            if not future.done():
+                future.set_result(resultado)
+
+    def _apply_batch(self, lote: List[tuple]) -> List[Any]:
+        """Aplica o lote em memória e grava uma única vez (no executor)"""
+        with self.storage.batch():
+            return [
+                getattr(self.storage, method_name)(*args)
+                for method_name, args, _ in lote
+            ]
+
+    def stats(self) -> Dict[str, int]:
+        """Operações recebidas x gravações feitas no disco"""
+        return {"operacoes": self.operacoes, "gravacoes": self.gravacoes}
+
+
+class _AsyncStorageBase:
+    """Base para as versões assíncronas dos armazenamentos"""
+
+    def __init__(self, storage, group_window: float | None = None):
+        self.storage = storage
+        self._executor = _executor_for(storage.filename)
+        window = GROUP_COMMIT_WINDOW if group_window is None else group_window
+        self._committer = None
+        if window > 0:
+            key = os.path.abspath(storage.filename)
+            if key not in _committers:
+                _committers[key] = GroupCommitter(storage, self._executor,
+                                                  window)
+            self._committer = _committers[key]
+
+    async def _run(self, func, *args, **kwargs):
+        """Executa uma chamada síncrona no executor do arquivo"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs))
+
+    async def _write(self, method_name: str, *args):
+        """Executa uma escrita, pelo group commit quando estiver ativo"""
+        if self._committer is None:
+            return await self._run(getattr(self.storage, method_name), *args)
+        return await self._committer.submit(method_name, *args)
+
+
+class AsyncEventStorage(_AsyncStorageBase):
+    """Versão aguardável do armazenamento de eventos"""
+
+    async def save_event(self, event_data: Dict[str, Any]) -> bool:
+        return await self._write('save_event', event_data)
+
+    async def get_recent_events(self,
+                                limit: int = 5) -> List[Dict[str, Any]]:
+        return await self._run(self.storage.get_recent_events, limit)
+
+    async def update_event_participants(
+            self, event_id: str, participants_data: Dict[str, Any]) -> bool:
+        return await self._write('update_event_participants',
+                               event_id, participants_data)
+
+    async def apply_participant_delta(self, event_id: str,
+                                      delta: Dict[str, Any]) -> bool:
+        return await self._write('apply_participant_delta', event_id, delta)
+
+    async def get_event_by_id(self, event_id: str) -> Dict[str, Any] | None:
+        return await self._run(self.storage.get_event_by_id, event_id)
+
+    async def cleanup_old_events(self, keep_count: int = 25) -> bool:
+        return await self._write('cleanup_old_events', keep_count)
+
+    async def delete_events(self, event_ids: List[str]) -> bool:
+        return await self._write('delete_events', event_ids)
+
+    async def get_all_events(self) -> List[Dict[str, Any]]:
+        return await self._run(self.storage.get_all_events)
+
+    async def get_active_polls(self) -> List[Dict[str, Any]]:
+        return await self._run(self.storage.get_active_polls)
+
+    async def compact_journal(self, force: bool = False) -> bool:
+        compact = getattr(self.storage, 'compact_journal', None)
+        if compact is None:
+            return False
+        return await self._run(compact, force)
+
+
+class AsyncVerificationStorage(_AsyncStorageBase):
+    """Versão aguardável do armazenamento de verificações"""
+
+    async def save_verification(self, user_data: Dict[str, Any]) -> bool:
+        return await self._write('save_verification', user_data)
+
+    async def get_all_verifications(self) -> List[Dict[str, Any]]:
+        return await self._run(self.storage.get_all_verifications)
+
+    async def get_verification_by_user(self,
+                                       user_id: int) -> Dict[str, Any] | None:
+        return await self._run(self.storage.get_verification_by_user,
+                               user_id)
+
+    async def count_verifications(self) -> int:
+        return await self._run(self.storage.count_verifications)
+
+    async def get_recent_verifications(
+            self, limit: int = 10) -> List[Dict[str, Any]]:
+        return await self._run(self.storage.get_recent_verifications, limit)
+
+    async def get_verifications_page(self,
+                                     limit: int = 10,
+                                     cursor: List[Any] | None = None,
+                                     direction: str = "next"
+                                     ) -> Dict[str, Any]:
+        return await self._run(self.storage.get_verifications_page, limit,
+                               cursor, direction)
+
+    async def import_verifications(self,
+                                   filename: str,
+                                   formato: str | None = None) -> int:
+        return await self._run(self.storage.import_verifications, filename,
+                               formato)
+
+    async def export_verifications(self,
+                                   filename: str,
+                                   formato: str | None = None) -> int:
+        return await self._run(self.storage.export_verifications, filename,
+                               formato)
+
+    async def get_verification_stats(self) -> Dict[str, Any]:
+        return await self._run(self.storage.get_verification_stats)
+
+    async def check_stats(self, repair: bool = True) -> bool:
+        return await self._run(self.storage.check_stats, repair)
+
+    async def count_by_vocacao(self) -> Dict[str, int]:
+        return await self._run(self.storage.count_by_vocacao)
+
+    async def count_by_status(self) -> Dict[str, int]:
+        return await self._run(self.storage.count_by_status)
+
+
+def get_async_event_storage() -> AsyncEventStorage:
+    """Retorna a versão assíncrona do armazenamento de eventos configurado"""
+    return AsyncEventStorage(get_event_storage())
+
+
+def get_async_verification_storage() -> AsyncVerificationStorage:
+    """Retorna a versão assíncrona do armazenamento de verificações configurado"""
+    return AsyncVerificationStorage(get_verification_storage())
+
+
+class LoopLagMonitor:
+    """Mede o atraso do event loop (quanto um sleep curto demora a mais)"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> Dict[str, float]:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        return self.stats()
+
+    async def _run(self):
+        while True:
+            inicio = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(
+                max(0.0,
+                    time.perf_counter() - inicio - self.interval))
+
+    def stats(self) -> Dict[str, float]:
+        """Retorna o atraso máximo, médio e p99 em milissegundos"""
+        if not self.samples:
+            return {"max_ms": 0.0, "media_ms": 0.0, "p99_ms": 0.0}
+        ordenadas = sorted(self.samples)
+        p99 = ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * 0.99))]
+        return {
+            "max_ms": ordenadas[-1] * 1000,
+            "media_ms": sum(ordenadas) / len(ordenadas) * 1000,
+            "p99_ms": p99 * 1000
+        }
\ No newline at end of file
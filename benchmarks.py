@@ -0,0 +1,718 @@
+"""Benchmarks do armazenamento do bot
+
+Uso: python benchmarks.py [nome ...]   (sem argumentos roda todos)
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+from async_storage import AsyncEventStorage, LoopLagMonitor
+import storage as storage_module
+from storage import EventStorage, SQLiteEventStorage
+from verification_storage import (SQLiteVerificationStorage,
+                                  VerificationStorage)
+
+
+def _criar_eventos(storage: EventStorage, quantidade: int):
+    """Popula o armazenamento com eventos fictícios"""
+    data = storage._load()
+    for i in range(quantidade):
+        data["eventos"].append({
+            "event_id": str(uuid.uuid4()),
+            "titulo": f"Evento {i}",
+            "limites": {"TANKER": 3, "HEALER": 3, "DPS": 24, "RESERVA": 5},
+            "data_criacao": "2025-06-21T14:43:54.279602",
+            "participantes": {
+                "DPS": [{
+                    "user_id": 1000 + j,
+                    "nome": f"Jogador {j}",
+                    "nome_servidor": f"Jogador {j}"
+                } for j in range(24)]
+            }
+        })
+    storage._write(data)
+    return data["eventos"][-1]["event_id"]
+
+
+def bench_loop_lag(votos: int = 40, eventos: int = 300):
+    """Atraso do event loop durante uma rajada de votos: síncrono x assíncrono"""
+
+    async def rajada(storage, event_id, assincrono):
+        monitor = LoopLagMonitor()
+        monitor.start()
+        participantes = {"TANKER": []}
+
+        async def votar(i):
+            participantes["TANKER"].append({"user_id": i})
+            if assincrono:
+                await AsyncEventStorage(
+                    storage, group_window=0).update_event_participants(
+                        event_id, participantes)
+            else:
+                storage.update_event_participants(event_id, participantes)
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(votar(i) for i in range(votos)))
+        duracao = time.perf_counter() - inicio
+        await asyncio.sleep(0.05)
+        return duracao, await monitor.stop()
+
+    pasta = tempfile.mkdtemp()
+    try:
+        storage = EventStorage(os.path.join(pasta, "eventos.json"),
+                               journal=False)
+        event_id = _criar_eventos(storage, eventos)
+        for modo, assincrono in (("síncrono", False), ("assíncrono", True)):
+            duracao, lag = asyncio.run(rajada(storage, event_id, assincrono))
+            print(f"[loop_lag] {modo:>10}: {votos} votos em {duracao:.2f}s | "
+                  f"lag máx {lag['max_ms']:.1f} ms, "
+                  f"p99 {lag['p99_ms']:.1f} ms, "
+                  f"médio {lag['media_ms']:.1f} ms")
+    finally:
+        shutil.rmtree(pasta)
+
+
+def bench_group_commit(votos: int = 20, janela: float = 0.2):
+    """Gravações no disco para votos espalhados em 1 segundo, com group commit"""
+
+    async def rajada(storage, event_id):
+        async_storage = AsyncEventStorage(storage, group_window=janela)
+
+        async def votar(i):
+            await asyncio.sleep(i / votos)  # votos espalhados em 1 segundo
+            return await async_storage.update_event_participants(
+                event_id, {"TANKER": [{"user_id": i}]})
+
+        inicio = time.perf_counter()
+        resultados = await asyncio.gather(*(votar(i) for i in range(votos)))
+        duracao = time.perf_counter() - inicio
+        return resultados, duracao, async_storage._committer.stats()
+
+    pasta = tempfile.mkdtemp()
+    try:
+        storage = EventStorage(os.path.join(pasta, "eventos.json"),
+                               journal=False)
+        event_id = _criar_eventos(storage, 25)
+        resultados, duracao, stats = asyncio.run(rajada(storage, event_id))
+        print(f"[group_commit] {votos} votos em {duracao:.2f}s, "
+              f"janela {janela * 1000:.0f} ms: {stats['gravacoes']} gravações "
+              f"(sem group commit: {votos}); todos ok: {all(resultados)}")
+    finally:
+        shutil.rmtree(pasta)
+
+
+def bench_recent_events(tamanhos=(100, 1000, 10000, 30000), repeticoes=20):
+    """Latência de get_recent_events(5) sem cache conforme o histórico cresce"""
+    for tamanho in tamanhos:
+        pasta = tempfile.mkdtemp()
+        try:
+            storage = EventStorage(os.path.join(pasta, "eventos.json"),
+                                   journal=False)
+            _criar_eventos(storage, tamanho)
+            # Como em outro processo: nenhuma cópia do arquivo em memória
+            storage.invalidate_cache()
+            inicio = time.perf_counter()
+            for _ in range(repeticoes):
+                storage.get_recent_events(5)
+            media = (time.perf_counter() - inicio) / repeticoes
+            print(f"[recent_events] {tamanho:>6} eventos: "
+                  f"{media * 1000:.2f} ms por consulta")
+        finally:
+            shutil.rmtree(pasta)
+
+
+def _gravar_eventos(arquivo: str, eventos: int, travas: bool):
+    """Processo de trabalho do bench_file_locks"""
+    storage_module.FILE_LOCKS_ENABLED = travas
+    storage = EventStorage(arquivo, journal=False)
+    storage.hot_limit = 10**9  # sem arquivamento durante o teste
+    for i in range(eventos):
+        storage.save_event({
+            "event_id": str(uuid.uuid4()),
+            "titulo": f"Evento {os.getpid()}-{i}",
+            "data_criacao": "2025-06-21T14:43:54.279602",
+            "participantes": {}
+        })
+
+
+def bench_file_locks(processos: int = 4, eventos: int = 50):
+    """Vários processos gravando no mesmo arquivo: com e sem trava"""
+    for travas in (True, False):
+        pasta = tempfile.mkdtemp()
+        try:
+            arquivo = os.path.join(pasta, "eventos.json")
+            EventStorage(arquivo, journal=False)
+            trabalhadores = [
+                multiprocessing.Process(target=_gravar_eventos,
+                                        args=(arquivo, eventos, travas))
+                for _ in range(processos)
+            ]
+            inicio = time.perf_counter()
+            for p in trabalhadores:
+                p.start()
+            for p in trabalhadores:
+                p.join()
+            duracao = time.perf_counter() - inicio
+            EventStorage._cache.clear()
+            total = len(EventStorage(arquivo, journal=False).get_all_events())
+            esperado = processos * eventos
+            print(f"[file_locks] travas {'on' if travas else 'off':>3}: "
+                  f"{esperado / duracao:.0f} gravações/s, "
+                  f"{total}/{esperado} eventos no arquivo "
+                  f"({esperado - total} perdidos)")
+        finally:
+            shutil.rmtree(pasta)
+
+
+def bench_bulk_import(registros: int = 100_000, laco: int = 1000):
+    """Importação/exportação em massa de verificações x save_verification"""
+    pasta = tempfile.mkdtemp()
+    try:
+        origem = os.path.join(pasta, "origem.jsonl")
+        with open(origem, 'w', encoding='utf-8') as f:
+            for i in range(registros):
+                f.write(
+                    json.dumps({
+                        "user_id": 10**17 + i,
+                        "nick_discord": f"membro{i}",
+                        "nome_global": f"Membro {i}",
+                        "nick_atual_servidor": f"[EK 500+] Membro {i}",
+                        "vocacao": ("EK", "MS", "RP", "ED", "MK")[i % 5],
+                        "status": "verificacao_concluida",
+                        "data": "21/06/2025 às 14:43:54 (Brasília)",
+                        "timestamp": f"2025-06-21T14:{i // 60 % 60:02d}:"
+                        f"{i % 60:02d}.{i:06d}-03:00"
+                    },
+                               ensure_ascii=False) + "\n")
+
+        backends = (
+            ("json", lambda: VerificationStorage(
+                os.path.join(pasta, "verificacao.json"))),
+            ("sqlite", lambda: SQLiteVerificationStorage(
+                os.path.join(pasta, "verificacao.db"),
+                os.path.join(pasta, "inexistente.json"))),
+        )
+        for nome, criar in backends:
+            storage = criar()
+            inicio = time.perf_counter()
+            total = storage.import_verifications(origem)
+            importacao = time.perf_counter() - inicio
+            inicio = time.perf_counter()
+            storage.export_verifications(os.path.join(pasta, f"{nome}.csv"))
+            exportacao = time.perf_counter() - inicio
+            print(f"[bulk_import] {nome:>6}: {total} registros importados em "
+                  f"{importacao:.2f}s, exportados (csv) em {exportacao:.2f}s; "
+                  f"total nas estatísticas: "
+                  f"{storage.get_verification_stats()['total']}")
+
+        # Comparação: um save_verification por registro
+        storage = VerificationStorage(os.path.join(pasta, "laco.json"))
+        inicio = time.perf_counter()
+        for i in range(laco):
+            storage.save_verification({"user_id": i, "status": "bench"})
+        duracao = time.perf_counter() - inicio
+        print(f"[bulk_import] save_verification em laço: {laco} registros em "
+              f"{duracao:.2f}s (~{duracao / laco * registros:.0f}s para "
+              f"{registros})")
+    finally:
+        shutil.rmtree(pasta)
+
+
+def bench_poll_edits(votos: int = 40, duracao: float = 2.0, latencia=0.3):
+    """Edições da mensagem da enquete durante uma rajada de votos"""
+    from coag.enquete import EditScheduler  # precisa do discord.py
+
+    async def rajada():
+        em_andamento = 0
+        max_em_andamento = 0
+
+        async def editar():
+            nonlocal em_andamento, max_em_andamento
+            em_andamento += 1
+            max_em_andamento = max(max_em_andamento, em_andamento)
+            await asyncio.sleep(latencia)  # ida e volta da API
+            em_andamento -= 1
+
+        editor = EditScheduler(editar)
+
+        async def votar(i):
+            await asyncio.sleep(i * duracao / votos)
+            editor.request()
+
+        await asyncio.gather(*(votar(i) for i in range(votos)))
+        await editor.flush()
+        return editor.stats(), max_em_andamento
+
+    stats, max_em_andamento = asyncio.run(rajada())
+    print(f"[poll_edits] {stats['votos']} votos em {duracao:.1f}s: "
+          f"{stats['edicoes']} edições (antes: {votos} edições + {votos} "
+          f"fetch_message), {stats['economizadas']} economizadas; "
+          f"máx. edições simultâneas: {max_em_andamento}")
+
+
+def bench_vote_delta(inscritos=(10, 100, 1000), votos: int = 200):
+    """Custo de um voto: lista completa x delta, conforme os inscritos crescem
+
+    "snapshot" é o JSON sem journal (padrão): o delta é aplicado em memória,
+    mas cada voto ainda regrava eventos.json inteiro.
+    """
+    for quantidade in inscritos:
+        pasta = tempfile.mkdtemp()
+        try:
+            backends = (
+                ("snapshot",
+                 EventStorage(os.path.join(pasta, "snapshot.json"))),
+                ("journal", EventStorage(os.path.join(pasta, "eventos.json"),
+                                         journal=True,
+                                         journal_max_bytes=1 << 40)),
+                ("sqlite", SQLiteEventStorage(
+                    os.path.join(pasta, "eventos.db"),
+                    os.path.join(pasta, "inexistente.json"))),
+            )
+            for nome, storage in backends:
+                participantes = {
+                    "DPS": [{
+                        "user_id": i,
+                        "nome": f"Jogador {i}",
+                        "nome_servidor": f"Jogador {i}"
+                    } for i in range(quantidade)]
+                }
+                storage.save_event({
+                    "event_id": "e",
+                    "titulo": "Evento",
+                    "data_criacao": "2025-06-21T14:43:54.279602"
+                })
+                storage.update_event_participants("e", participantes)
+
+                resultados = []
+                for modo in ("lista", "delta"):
+                    inicio = time.perf_counter()
+                    for i in range(votos):
+                        user_id = 10**6 + i
+                        if modo == "lista":
+                            participantes["DPS"].append({
+                                "user_id": user_id,
+                                "nome": "Novo",
+                                "nome_servidor": "Novo"
+                            })
+                            storage.update_event_participants(
+                                "e", participantes)
+                            participantes["DPS"].pop()
+                        else:
+                            storage.apply_participant_delta(
+                                "e", {
+                                    "op": "entrar",
+                                    "user_id": user_id,
+                                    "categoria": "DPS",
+                                    "nome": "Novo"
+                                })
+                            storage.apply_participant_delta(
+                                "e", {
+                                    "op": "sair",
+                                    "user_id": user_id,
+                                    "categoria": "DPS"
+                                })
+                    passos = votos if modo == "lista" else votos * 2
+                    resultados.append(
+                        (time.perf_counter() - inicio) / passos * 1000)
+                print(f"[vote_delta] {nome:>8}, {quantidade:>4} inscritos: "
+                      f"lista completa {resultados[0]:.3f} ms/voto, "
+                      f"delta {resultados[1]:.3f} ms/voto")
+        finally:
+            shutil.rmtree(pasta)
+
+
+def bench_vote_concurrency(enquetes=(1, 10), cliques: int = 500,
+                           usuarios: int = 200, latencia: float = 0.005):
+    """Centenas de cliques simultâneos: limites respeitados e votos por segundo"""
+    import random
+    from types import SimpleNamespace
+
+    from coag.enquete import EnqueteView  # precisa do discord.py
+
+    limites = {"TANKER": 2, "HEALER": 3, "DPS": 10, "RESERVA": 5}
+
+    async def api():
+        # Ida e volta simulada da API do Discord
+        await asyncio.sleep(random.uniform(0, latencia))
+
+    class Mensagem:
+
+        async def edit(self, **kwargs):
+            await api()
+            return self
+
+    def membro(user_id):
+        return SimpleNamespace(id=user_id, nick=f"Jogador {user_id}",
+                               global_name=None, name=f"jogador{user_id}")
+
+    async def rajada(storage, quantidade):
+        guild = SimpleNamespace(id=1, get_member=membro)
+        canal = SimpleNamespace(id=10, guild=guild,
+                                get_partial_message=lambda _: Mensagem())
+        bot = SimpleNamespace(get_channel=lambda _: canal,
+                              get_guild=lambda _: guild)
+
+        views = []
+        violacoes = 0
+        for i in range(quantidade):
+            evento = {
+                "event_id": f"enquete-{i}",
+                "titulo": f"Enquete {i}",
+                "horario": "20:00",
+                "levar": "Não especificado",
+                "autor_id": 0,
+                "canal_id": canal.id,
+                "message_id": i,
+                "data_criacao": "2025-06-21T14:43:54.279602"
+            }
+            storage.storage.save_event(evento)
+            view = EnqueteView(bot, evento, limites)
+            view.storage = storage
+
+            def conferir(user_id, tipo, view=view, aplicar=view.aplicar_voto):
+                # Invariantes conferidas a cada voto aplicado
+                nonlocal violacoes
+                resultado = aplicar(user_id, tipo)
+                for categoria, votos in view.votos.items():
+                    if len(votos) > view.limites[categoria]:
+                        violacoes += 1
+                return resultado
+
+            view.aplicar_voto = conferir
+            views.append(view)
+
+        async def clicar(view, user_id, tipo):
+            async def send_message(*args, **kwargs):
+                await api()
+
+            interaction = SimpleNamespace(
+                user=SimpleNamespace(id=user_id),
+                guild=guild,
+                message=Mensagem(),
+                response=SimpleNamespace(send_message=send_message,
+                                         is_done=lambda: False),
+                followup=SimpleNamespace(send=send_message))
+            await view.processar_voto(interaction, tipo)
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(clicar(random.choice(views),
+                                      random.randrange(usuarios),
+                                      random.choice(list(limites)))
+                               for _ in range(cliques)))
+        duracao = time.perf_counter() - inicio
+        for view in views:
+            await view.fila.join()
+            await view.editor.flush()
+        return views, violacoes, duracao
+
+    for quantidade in enquetes:
+        pasta = tempfile.mkdtemp()
+        try:
+            storage = AsyncEventStorage(
+                EventStorage(os.path.join(pasta, "eventos.json"),
+                             journal=True))
+            views, violacoes, duracao = asyncio.run(
+                rajada(storage, quantidade))
+
+            # Estado em memória coerente e igual ao que foi gravado
+            divergentes = 0
+            for view in views:
+                donos = [u for votos in view.votos.values() for u in votos]
+                if (len(donos) != len(set(donos)) or
+                        sorted(donos) != sorted(view.user_votes)):
+                    divergentes += 1
+                    continue
+                salvo = storage.storage.get_event_by_id(
+                    view.enquete_data["event_id"])
+                gravados = {
+                    tipo: [p["user_id"] for p in participantes]
+                    for tipo, participantes in salvo.get(
+                        "participantes", {}).items() if participantes
+                }
+                if gravados != {t: v for t, v in view.votos.items() if v}:
+                    divergentes += 1
+
+            print(f"[vote_concurrency] {quantidade:>2} enquete(s), "
+                  f"{cliques} cliques: {cliques / duracao:.0f} votos/s | "
+                  f"limites excedidos: {violacoes}, "
+                  f"enquetes divergentes: {divergentes}")
+            if violacoes or divergentes:
+                raise AssertionError("votos concorrentes fora de ordem")
+        finally:
+            shutil.rmtree(pasta)
+
+
+def bench_poll_router(enquetes: int = 2000, ondas: int = 20,
+                      cliques: int = 200, tamanhos=(64, 2000)):
+    """Muitas enquetes abertas: memória limitada pelo cache, não pelas enquetes"""
+    import gc
+    import random
+    import tracemalloc
+    from types import SimpleNamespace
+
+    import coag.enquete as enquete  # precisa do discord.py
+
+    limites = {"TANKER": 2, "HEALER": 3, "DPS": 10, "RESERVA": 5}
+
+    class Mensagem:
+
+        async def edit(self, **kwargs):
+            return self
+
+    async def rajada(storage, tamanho):
+        enquete.enquetes_cache = cache = enquete.EnqueteCache(
+            tamanho, storage)
+        guild = SimpleNamespace(id=1, get_member=lambda _: None)
+        canal = SimpleNamespace(id=10, guild=guild,
+                                get_partial_message=lambda _: Mensagem())
+        bot = SimpleNamespace(
+            get_channel=lambda _: canal,
+            get_guild=lambda _: guild,
+            get_user=lambda _: SimpleNamespace(global_name="Jogador",
+                                               name="jogador"))
+
+        async def responder(*args, **kwargs):
+            pass
+
+        async def clicar(i):
+            # Cliques concentrados nas enquetes mais recentes
+            numero = min(int(random.expovariate(1 / 200)), enquetes - 1)
+            tipo = random.choice(list(limites))
+            custom_id = f"enquete:enquete-{numero}:{tipo}"
+            item = await enquete.VotoEnquete.from_custom_id(
+                None, None,
+                enquete.VotoEnquete.__discord_ui_compiled_template__.
+                fullmatch(custom_id))
+            await item.callback(
+                SimpleNamespace(
+                    client=bot,
+                    user=SimpleNamespace(id=i),
+                    guild=guild,
+                    message=Mensagem(),
+                    response=SimpleNamespace(send_message=responder,
+                                             is_done=lambda: False),
+                    followup=SimpleNamespace(send=responder)))
+
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        for onda in range(ondas):
+            await asyncio.gather(*(clicar(onda * cliques + i)
+                                   for i in range(cliques)))
+        duracao = time.perf_counter() - inicio
+        for view in list(cache._vivas.values()):
+            await view.fila.join()
+            await view.editor.flush()
+        gc.collect()
+        # Memória que continua ocupada depois da rajada
+        retida, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return cache.stats(), duracao, retida
+
+    pasta = tempfile.mkdtemp()
+    try:
+        storage = SQLiteEventStorage(os.path.join(pasta, "eventos.db"),
+                                     os.path.join(pasta, "inexistente.json"))
+        with storage.batch():
+            for i in range(enquetes):
+                storage.save_event({
+                    "event_id": f"enquete-{i}",
+                    "titulo": f"Enquete {i}",
+                    "horario": "20:00",
+                    "levar": "Não especificado",
+                    "autor_id": 0,
+                    "canal_id": 10,
+                    "message_id": i,
+                    "limites": limites,
+                    "ativa": True,
+                    "data_criacao": "2025-06-21T14:43:54.279602"
+                })
+        for tamanho in tamanhos:
+            stats, duracao, retida = asyncio.run(
+                rajada(AsyncEventStorage(storage), tamanho))
+            print(f"[poll_router] {enquetes} enquetes, cache {tamanho:>4}: "
+                  f"{ondas * cliques / duracao:.0f} votos/s | "
+                  f"{stats['enquetes']} em memória, "
+                  f"{stats['hits']} acertos, {stats['misses']} carregadas | "
+                  f"memória retida {retida / 2**20:.1f} MiB")
+    finally:
+        shutil.rmtree(pasta)
+
+
+def bench_name_resolver(usuarios: int = 200, fora_do_servidor: int = 50,
+                        latencia: float = 0.03):
+    """Nomes de usuários fora do cache: fetch_user um a um x lote"""
+    from types import SimpleNamespace
+
+    from name_cache import NameCache, display_name
+
+    membros = set(range(usuarios - fora_do_servidor))
+    chamadas = {"query_members": 0, "fetch_user": 0}
+    simultaneas = {"atual": 0, "max": 0}
+
+    async def query_members(user_ids, limit, cache):
+        chamadas["query_members"] += 1
+        await asyncio.sleep(latencia)
+        return [
+            SimpleNamespace(id=u, nick=None, global_name=f"Membro {u}",
+                            name=f"membro{u}") for u in user_ids
+            if u in membros
+        ]
+
+    async def fetch_user(user_id):
+        chamadas["fetch_user"] += 1
+        simultaneas["atual"] += 1
+        simultaneas["max"] = max(simultaneas["max"], simultaneas["atual"])
+        await asyncio.sleep(latencia)
+        simultaneas["atual"] -= 1
+        return SimpleNamespace(id=user_id, global_name=None,
+                               name=f"usuario{user_id}")
+
+    # Cache vazio, como logo após reiniciar
+    guild = SimpleNamespace(id=1, get_member=lambda _: None,
+                            query_members=query_members)
+    bot = SimpleNamespace(get_user=lambda _: None, fetch_user=fetch_user)
+
+    async def um_a_um():
+        nomes = {}
+        for user_id in range(usuarios):
+            member = guild.get_member(user_id)
+            user = member or bot.get_user(user_id) or await bot.fetch_user(
+                user_id)
+            nomes[user_id] = display_name(user)
+        return nomes
+
+    async def em_lote():
+        cache = NameCache()
+        # Pedidos simultâneos, como votos chegando juntos
+        return await cache.resolve_many(bot, guild, range(usuarios))
+
+    for modo, resolver in (("um a um", um_a_um), ("em lote", em_lote)):
+        for chave in chamadas:
+            chamadas[chave] = 0
+        simultaneas["max"] = 0
+        inicio = time.perf_counter()
+        nomes = asyncio.run(resolver())
+        duracao = time.perf_counter() - inicio
+        print(f"[name_resolver] {modo}: {len(nomes)} nomes em "
+              f"{duracao:.2f}s | query_members {chamadas['query_members']}, "
+              f"fetch_user {chamadas['fetch_user']} "
+              f"(máx. {simultaneas['max']} simultâneos)")
+
+
+def bench_vote_pipeline(cliques: int = 1000, usuarios: int = 400,
+                        filas=(1000, 50)):
+    """Resposta ao clique com a gravação em segundo plano: ack e fila"""
+    import random
+    from types import SimpleNamespace
+
+    import coag.enquete as enquete  # precisa do discord.py
+
+    limites = {"TANKER": 20, "HEALER": 30, "DPS": 100, "RESERVA": 50}
+
+    class Mensagem:
+
+        async def edit(self, **kwargs):
+            return self
+
+    async def rajada(storage, tamanho):
+        guild = SimpleNamespace(id=1, get_member=lambda _: None)
+        canal = SimpleNamespace(id=10, guild=guild,
+                                get_partial_message=lambda _: Mensagem())
+        bot = SimpleNamespace(
+            get_channel=lambda _: canal,
+            get_guild=lambda _: guild,
+            get_user=lambda _: SimpleNamespace(global_name="Jogador",
+                                               name="jogador"))
+        evento = {
+            "event_id": f"pipeline-{tamanho}",
+            "titulo": "Enquete",
+            "horario": "20:00",
+            "levar": "Não especificado",
+            "autor_id": 0,
+            "canal_id": canal.id,
+            "message_id": 1,
+            "data_criacao": "2025-06-21T14:43:54.279602"
+        }
+        storage.storage.save_event(evento)
+        view = enquete.EnqueteView(bot, evento, limites)
+        view.storage = storage
+        view.fila = enquete.FilaVotos(view.gravar_votos, tamanho)
+
+        async def responder(*args, **kwargs):
+            pass
+
+        async def clicar(i):
+            await asyncio.sleep(random.uniform(0, 1))
+            await view.processar_voto(
+                SimpleNamespace(
+                    user=SimpleNamespace(id=random.randrange(usuarios)),
+                    guild=guild,
+                    message=Mensagem(),
+                    response=SimpleNamespace(send_message=responder,
+                                             defer=responder,
+                                             is_done=lambda: False),
+                    followup=SimpleNamespace(send=responder)),
+                random.choice(list(limites)))
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(clicar(i) for i in range(cliques)))
+        await view.fila.join()
+        gravados = time.perf_counter() - inicio
+        await view.editor.flush()
+
+        salvo = storage.storage.get_event_by_id(evento["event_id"])
+        iguais = {
+            tipo: [p["user_id"] for p in participantes]
+            for tipo, participantes in salvo["participantes"].items()
+        } == view.votos
+        return gravados, iguais
+
+    pasta = tempfile.mkdtemp()
+    try:
+        storage = AsyncEventStorage(
+            EventStorage(os.path.join(pasta, "eventos.json"), journal=True))
+        for tamanho in filas:
+            # Métricas desta rodada apenas
+            enquete.FilaVotos.tempos_resposta.clear()
+            enquete.FilaVotos.profundidade_max = 0
+            enquete.FilaVotos.total_esperas = 0
+            enquete.FilaVotos.total_adiados = 0
+            gravados, iguais = asyncio.run(rajada(storage, tamanho))
+            metricas = enquete.FilaVotos.metricas()
+            print(f"[vote_pipeline] fila {tamanho:>4}, {cliques} cliques em "
+                  f"1s: resposta média {metricas['resposta_media_ms']:.2f} "
+                  f"ms, p99 {metricas['resposta_p99_ms']:.2f} ms | "
+                  f"maior fila {metricas['profundidade_max']}, "
+                  f"{metricas['esperas']} esperas por fila cheia "
+                  f"({metricas['adiados']} com defer) | "
+                  f"tudo gravado em {gravados:.2f}s, armazenamento "
+                  f"{'igual' if iguais else 'DIFERENTE'} da memória")
+    finally:
+        shutil.rmtree(pasta)
+
+
+BENCHMARKS = {
+    "loop_lag": bench_loop_lag,
+    "group_commit": bench_group_commit,
+    "recent_events": bench_recent_events,
+    "file_locks": bench_file_locks,
+    "bulk_import": bench_bulk_import,
+    "poll_edits": bench_poll_edits,
+    "vote_delta": bench_vote_delta,
+    "vote_concurrency": bench_vote_concurrency,
+    "poll_router": bench_poll_router,
+    "name_resolver": bench_name_resolver,
+    "vote_pipeline": bench_vote_pipeline,
+}
+
+if __name__ == "__main__":
+    nomes = sys.argv[1:] or list(BENCHMARKS)
+    for nome in nomes:
+        BENCHMARKS[nome]()
\ No newline at end of file
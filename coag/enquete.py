@@ -1,11 +1,348 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import app_commands
 import asyncio
+import os
+import time
+import weakref
+from collections import OrderedDict, deque
 from datetime import datetime
 import pytz
 import uuid
-from storage import EventStorage
+from async_storage import get_async_event_storage
+from name_cache import name_cache
+
+# Janela em que os votos de uma enquete são agrupados em uma só edição
+JANELA_EDICAO = float(os.getenv("ENQUETE_EDIT_WINDOW_MS", 500)) / 1000
+
+# Quantas enquetes ficam em memória (as demais são lidas do armazenamento)
+TAMANHO_CACHE_ENQUETES = int(os.getenv("ENQUETE_CACHE_SIZE", 256))
+
+# Votos aguardando gravação por enquete; com a fila cheia quem vota espera
+TAMANHO_FILA_VOTOS = int(os.getenv("ENQUETE_VOTE_QUEUE_SIZE", 1000))
+
+
+# Uma trava por evento: os votos de uma enquete são aplicados em ordem,
+# enquetes diferentes seguem em paralelo
+_travas_eventos = weakref.WeakValueDictionary()
+
+
+def trava_do_evento(event_id) -> asyncio.Lock:
+    """Trava de votação do evento (criada no primeiro uso)"""
+    trava = _travas_eventos.get(event_id)
+    if trava is None:
+        trava = asyncio.Lock()
+        _travas_eventos[event_id] = trava
+    return trava
+
+
+class ChannelGuildIndex:
+    """Índice canal -> servidor, para achar o servidor de uma enquete em O(1)
+
+    Montado a partir de bot.guilds e mantido pelos eventos de criação e
+    remoção de canais/servidores (ver listeners do cog Enquete).
+    """
+
+    def __init__(self):
+        self._guild_ids = {}  # {channel_id: guild_id}
+
+    def rebuild(self, guilds):
+        self._guild_ids.clear()
+        for guild in guilds:
+            self.add_guild(guild)
+
+    def add_guild(self, guild):
+        for channel in guild.channels:
+            self._guild_ids[channel.id] = guild.id
+
+    def remove_guild(self, guild):
+        for channel_id in [
+                c for c, g in self._guild_ids.items() if g == guild.id
+        ]:
+            del self._guild_ids[channel_id]
+
+    def add_channel(self, channel):
+        self._guild_ids[channel.id] = channel.guild.id
+
+    def remove_channel(self, channel):
+        self._guild_ids.pop(channel.id, None)
+
+    def resolve(self, bot, channel_id):
+        """Servidor do canal, ou None se o bot não o conhece"""
+        guild_id = self._guild_ids.get(channel_id)
+        if guild_id is not None:
+            guild = bot.get_guild(guild_id)
+            if guild is not None:
+                return guild
+        # Canal fora do índice (ex.: thread): consultar o cache do discord.py
+        channel = bot.get_channel(channel_id)
+        guild = getattr(channel, 'guild', None)
+        if guild is not None:
+            self._guild_ids[channel_id] = guild.id
+        return guild
+
+
+channel_index = ChannelGuildIndex()
+
+
+class EditScheduler:
+    """Agrupa as edições da mensagem de uma enquete
+
+    Cada voto só marca a mensagem como desatualizada; ao fim da janela uma
+    única edição é feita com o estado mais recente, e as renderizações
+    intermediárias nunca são montadas. Há no máximo uma edição em andamento
+    por mensagem: votos que chegam durante ela geram mais uma (só uma).
+    """
+
+    # Totais de todas as enquetes (ver /metricas_eventos)
+    total_votos = 0
+    total_edicoes = 0
+    total_fetches = 0  # fetch_message feitos porque a edição direta falhou
+
+    def __init__(self, editar, window: float | None = None):
+        self.editar = editar  # corrotina que monta e envia a edição
+        self.window = JANELA_EDICAO if window is None else window
+        self._pendente = False
+        self._task: asyncio.Task | None = None
+        self.votos = 0
+        self.edicoes = 0
+
+    def request(self):
+        """Marca a mensagem como desatualizada e agenda a edição"""
+        self._pendente = True
+        self.votos += 1
+        EditScheduler.total_votos += 1
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while self._pendente:
+            await asyncio.sleep(self.window)
+            self._pendente = False
+            self.edicoes += 1
+            EditScheduler.total_edicoes += 1
+            try:
+                await self.editar()
+            except Exception as e:
+                print(f"Erro ao editar mensagem da enquete: {e}")
+
+    async def flush(self):
+        """Aguarda a edição pendente (se houver)"""
+        if self._task is not None:
+            await self._task
+
+    def stats(self):
+        """Votos recebidos x edições enviadas desta mensagem"""
+        return {
+            "votos": self.votos,
+            "edicoes": self.edicoes,
+            "economizadas": self.votos - self.edicoes
+        }
+
+    @classmethod
+    def metricas(cls):
+        """Votos recebidos x edições enviadas de todas as enquetes"""
+        return {
+            "votos": cls.total_votos,
+            "edicoes": cls.total_edicoes,
+            "economizadas": cls.total_votos - cls.total_edicoes,
+            "fetches": cls.total_fetches
+        }
+
+
+class FilaVotos:
+    """Etapa de gravação dos votos de uma enquete
+
+    O clique é aplicado em memória e respondido na hora; o delta entra
+    nesta fila e um consumidor grava os deltas em ordem, em lotes (tudo o
+    que chegou enquanto o lote anterior era gravado). A fila é limitada:
+    cheia, quem vota espera por espaço (backpressure).
+    """
+
+    # Totais de todas as enquetes (ver /metricas_eventos)
+    total_enfileirados = 0
+    total_gravados = 0
+    total_esperas = 0  # votos que encontraram a fila cheia
+    total_adiados = 0  # cliques reconhecidos com defer() por causa da fila
+    pendentes = 0  # votos aguardando gravação agora
+    profundidade_max = 0  # maior fila de uma enquete
+    tempos_resposta = deque(maxlen=1000)  # ms de trabalho até responder
+
+    def __init__(self, gravar, maxsize: int = TAMANHO_FILA_VOTOS):
+        self.gravar = gravar  # corrotina que grava uma lista de deltas
+        self._fila = asyncio.Queue(maxsize)
+        self._task: asyncio.Task | None = None
+        self._nao_gravados = 0  # na fila ou no lote sendo gravado
+
+    def __len__(self):
+        return self._fila.qsize()
+
+    def cheia(self) -> bool:
+        return self._fila.full()
+
+    def vazia(self) -> bool:
+        """Nenhum delta esperando nem sendo gravado"""
+        return not self._nao_gravados
+
+    async def put(self, delta):
+        """Enfileira o delta (espera se a fila estiver cheia)"""
+        if self._fila.full():
+            FilaVotos.total_esperas += 1
+        await self._fila.put(delta)
+        self._nao_gravados += 1
+        FilaVotos.total_enfileirados += 1
+        FilaVotos.pendentes += 1
+        FilaVotos.profundidade_max = max(FilaVotos.profundidade_max,
+                                         self._fila.qsize())
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(
+                self._consumir())
+
+    async def _consumir(self):
+        while not self._fila.empty():
+            lote = []
+            while not self._fila.empty():
+                lote.append(self._fila.get_nowait())
+            try:
+                await self.gravar(lote)
+            except Exception as e:
+                print(f"Erro ao gravar votos da enquete: {e}")
+            self._nao_gravados -= len(lote)
+            for _ in lote:
+                self._fila.task_done()
+            FilaVotos.total_gravados += len(lote)
+            FilaVotos.pendentes -= len(lote)
+
+    async def join(self):
+        """Aguarda a gravação de todos os votos enfileirados"""
+        await self._fila.join()
+
+    @classmethod
+    def registrar_resposta(cls, inicio: float):
+        cls.tempos_resposta.append((time.perf_counter() - inicio) * 1000)
+
+    @classmethod
+    def metricas(cls):
+        """Fila de gravação e tempo de resposta de todas as enquetes"""
+        tempos = sorted(cls.tempos_resposta)
+        return {
+            "enfileirados": cls.total_enfileirados,
+            "gravados": cls.total_gravados,
+            "pendentes": cls.pendentes,
+            "profundidade_max": cls.profundidade_max,
+            "esperas": cls.total_esperas,
+            "adiados": cls.total_adiados,
+            "resposta_media_ms":
+            sum(tempos) / len(tempos) if tempos else 0.0,
+            "resposta_p99_ms":
+            tempos[int(len(tempos) * 0.99)] if tempos else 0.0
+        }
+
+
+class EnqueteCache:
+    """LRU das enquetes em uso, carregadas do armazenamento sob demanda"""
+
+    def __init__(self, tamanho: int = TAMANHO_CACHE_ENQUETES, storage=None):
+        self.tamanho = tamanho
+        self.storage = storage  # None: armazenamento configurado
+        self._views = OrderedDict()  # {event_id: EnqueteView}
+        # Enquetes que saíram do LRU mas ainda têm voto/edição em andamento:
+        # reaproveitadas para não recarregar um estado ainda não gravado
+        self._vivas = weakref.WeakValueDictionary()
+        self._carregando = {}  # {event_id: asyncio.Task}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._views)
+
+    def put(self, view):
+        """Guarda a enquete como a mais recente, descartando a mais antiga"""
+        event_id = view.enquete_data['event_id']
+        self._views[event_id] = view
+        self._views.move_to_end(event_id)
+        self._vivas[event_id] = view
+        while len(self._views) > self.tamanho:
+            self._views.popitem(last=False)
+
+    async def get(self, bot, event_id):
+        """Enquete do evento, ou None se ela não existe mais"""
+        view = self._views.get(event_id) or self._vivas.get(event_id)
+        if view is not None:
+            self.hits += 1
+            self.put(view)
+            return view
+
+        # Cliques simultâneos na mesma enquete esperam uma única leitura
+        tarefa = self._carregando.get(event_id)
+        if tarefa is None:
+            self.misses += 1
+            tarefa = asyncio.ensure_future(self._carregar(bot, event_id))
+            self._carregando[event_id] = tarefa
+            tarefa.add_done_callback(
+                lambda _: self._carregando.pop(event_id, None))
+        else:
+            self.hits += 1
+        return await tarefa
+
+    async def _carregar(self, bot, event_id):
+        storage = self.storage or get_async_event_storage()
+        try:
+            evento = await storage.get_event_by_id(event_id)
+        except Exception as e:
+            print(f"Erro ao carregar enquete {event_id}: {e}")
+            return None
+        if evento is None:
+            return None
+        view = EnqueteView(bot, evento, evento.get('limites', {}))
+        view.storage = storage
+        view.carregar_participantes(evento.get('participantes'))
+        self.put(view)
+        return view
+
+    def clear(self):
+        self._views.clear()
+
+    def stats(self):
+        return {
+            "enquetes": len(self._views),
+            "tamanho": self.tamanho,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+enquetes_cache = EnqueteCache()
+
+
+class VotoEnquete(discord.ui.DynamicItem[discord.ui.Button],
+                  template=r'enquete:(?P<event_id>[^:]+):(?P<tipo>[A-Z]+)'):
+    """Botão de voto: o custom_id leva o evento e a categoria
+
+    Um único roteador atende os botões de todas as enquetes; o estado vem
+    do EnqueteCache, não de uma view registrada por mensagem.
+    """
+
+    def __init__(self, event_id, tipo, button=None):
+        super().__init__(button or discord.ui.Button(
+            style=discord.ButtonStyle.secondary,
+            custom_id=f"enquete:{event_id}:{tipo}"))
+        self.event_id = event_id
+        self.tipo = tipo
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(match['event_id'], match['tipo'], item)
+
+    async def callback(self, interaction):
+        view = await enquetes_cache.get(interaction.client, self.event_id)
+        if view is None or self.tipo not in view.votos:
+            await interaction.response.send_message(
+                "❌ Esta enquete não está mais disponível!", ephemeral=True)
+            return
+        if view.mensagem is None:
+            view.mensagem = interaction.message
+        await view.processar_voto(interaction, self.tipo)
 
 
 class EnqueteView(discord.ui.View):
@@ -17,7 +354,22 @@ class EnqueteView(discord.ui.View):
         self.limites = limites
         self.votos = {'TANKER': [], 'HEALER': [], 'DPS': [], 'RESERVA': []}
         self.user_votes = {}
-        self.storage = EventStorage()
+        # Nome salvo de cada participante (de quando entrou na enquete)
+        self.nomes_salvos = {}
+        self.storage = get_async_event_storage()
+        # Edições da mensagem agrupadas por janela (ver EditScheduler)
+        self.editor = EditScheduler(self.editar_mensagem)
+        # Gravação dos votos fora do caminho da resposta (ver FilaVotos)
+        self.fila = FilaVotos(self.gravar_votos)
+        self._ultima_interacao = None
+        # Recarga do estado depois de um delta recusado (ver recarregar)
+        self._recarga: asyncio.Task | None = None
+        # Handle da mensagem da enquete, para editar sem fetch_message
+        self.mensagem = None
+        # Votos desta enquete passam por uma trava própria
+        self.trava = trava_do_evento(enquete_data['event_id'])
+        # Servidor da enquete, resolvido uma vez pelo índice de canais
+        self.guild = channel_index.resolve(bot, enquete_data['canal_id'])
 
         # Emojis para cada tipo
         self.emojis = {
@@ -33,67 +385,58 @@ class EnqueteView(discord.ui.View):
         # Adicionar botões para cada tipo na ordem especificada
         for tipo in ordem_tipos:
             if tipo in limites and limites[tipo] > 0:
-                button = discord.ui.Button(label=f"{tipo} (0/{limites[tipo]})",
-                                           emoji=self.emojis[tipo],
-                                           style=discord.ButtonStyle.secondary,
-                                           custom_id=f"vote_{tipo}")
-                button.callback = self.make_vote_callback(tipo)
-                self.add_item(button)
-
-    def make_vote_callback(self, tipo):
-
-        async def vote_callback(interaction):
-            await self.processar_voto(interaction, tipo)
-
-        return vote_callback
+                botao = VotoEnquete(enquete_data['event_id'], tipo)
+                botao.item.label = f"{tipo} (0/{limites[tipo]})"
+                botao.item.emoji = self.emojis[tipo]
+                self.add_item(botao)
+
+    def carregar_participantes(self, participantes):
+        """Reconstrói votos/user_votes a partir dos participantes salvos"""
+        for tipo, lista in (participantes or {}).items():
+            if tipo not in self.votos:
+                continue
+            for participante in lista:
+                user_id = participante.get('user_id')
+                if user_id is None or user_id in self.user_votes:
+                    continue
+                self.votos[tipo].append(user_id)
+                self.user_votes[user_id] = tipo
+                self.nomes_salvos[user_id] = participante.get(
+                    'nome_servidor') or participante.get('nome')
 
     async def processar_voto(self, interaction, tipo):
+        inicio = time.perf_counter()
         try:
             user_id = interaction.user.id
 
-            # Verificar se já votou em algum tipo
-            if user_id in self.user_votes:
-                tipo_anterior = self.user_votes[user_id]
-                if tipo_anterior == tipo:
-                    # Permitir desmarcar a própria seleção
-                    self.votos[tipo].remove(user_id)
-                    del self.user_votes[user_id]
-
-                    await interaction.response.send_message(
-                        f"✅ Você foi removido da categoria **{tipo}** {self.emojis[tipo]}!",
-                        ephemeral=True)
-
-                    # Salvar participantes no JSON
-                    await self.salvar_participantes()
-
-                    # Atualizar os botões após responder
-                    await self.atualizar_botoes_followup(interaction)
-                    return
-
-                # Remover voto anterior
-                if user_id in self.votos[tipo_anterior]:
-                    self.votos[tipo_anterior].remove(user_id)
-
-            # Verificar se o tipo atingiu o limite
-            if len(self.votos[tipo]) >= self.limites[tipo]:
-                await interaction.response.send_message(
-                    f"❌ A categoria **{tipo}** já atingiu o limite de {self.limites[tipo]} jogadores!",
-                    ephemeral=True)
-                return
-
-            # Adicionar novo voto
-            self.votos[tipo].append(user_id)
-            self.user_votes[user_id] = tipo
-
-            await interaction.response.send_message(
-                f"✅ Você foi registrado como **{tipo}** {self.emojis[tipo]}!",
-                ephemeral=True)
-
-            # Salvar participantes no JSON
-            await self.salvar_participantes()
+            # Com a fila de gravação cheia (ou alguém já esperando por ela)
+            # o voto vai esperar: reconhecer o clique antes, para não passar
+            # do prazo de 3 s da interação, e responder depois pelo followup
+            adiado = self.trava.locked() or self.fila.cheia()
+            if adiado:
+                FilaVotos.total_adiados += 1
+                FilaVotos.registrar_resposta(inicio)
+                await interaction.response.defer(ephemeral=True,
+                                                 thinking=True)
+
+            # Estado aplicado e delta enfileirado em ordem, um voto por vez
+            # (a trava só é disputada com a fila de gravação cheia)
+            async with self.trava:
+                resposta, delta = self.aplicar_voto(user_id, tipo)
+                if delta:
+                    await self.fila.put(delta)
+
+            # Responder já: gravação e edição da mensagem seguem nas etapas
+            # próprias (FilaVotos e EditScheduler)
+            if adiado:
+                await interaction.followup.send(resposta, ephemeral=True)
+            else:
+                FilaVotos.registrar_resposta(inicio)
+                await interaction.response.send_message(resposta,
+                                                        ephemeral=True)
 
-            # Atualizar os botões após responder
-            await self.atualizar_botoes_followup(interaction)
+            if delta:
+                await self.atualizar_botoes_followup(interaction)
 
         except Exception as e:
             print(f"Erro ao processar voto: {e}")
@@ -109,120 +452,149 @@ class EnqueteView(discord.ui.View):
             except:
                 pass
 
-    async def salvar_participantes(self):
-        """Salva os participantes atuais no JSON com nickname do servidor"""
+    def aplicar_voto(self, user_id, tipo):
+        """Aplica o clique ao estado em memória
+
+        Retorna a resposta para o usuário e o delta a gravar (None se o voto
+        foi recusado). Não faz I/O: chamado com a trava do evento. O nome de
+        quem entra é resolvido depois, na gravação (ver gravar_votos).
+        """
+        tipo_anterior = self.user_votes.get(user_id)
+
+        # Permitir desmarcar a própria seleção
+        if tipo_anterior == tipo:
+            self.votos[tipo].remove(user_id)
+            del self.user_votes[user_id]
+            self.nomes_salvos.pop(user_id, None)
+            return (
+                f"✅ Você foi removido da categoria **{tipo}** {self.emojis[tipo]}!",
+                {
+                    "op": "sair",
+                    "user_id": user_id,
+                    "categoria": tipo
+                })
+
+        # Verificar se o tipo atingiu o limite (antes de mexer no voto
+        # anterior, que continua valendo se a troca for recusada)
+        if len(self.votos[tipo]) >= self.limites[tipo]:
+            return (
+                f"❌ A categoria **{tipo}** já atingiu o limite de {self.limites[tipo]} jogadores!",
+                None)
+
+        # Remover voto anterior
+        if tipo_anterior and user_id in self.votos[tipo_anterior]:
+            self.votos[tipo_anterior].remove(user_id)
+
+        # Adicionar novo voto
+        self.votos[tipo].append(user_id)
+        self.user_votes[user_id] = tipo
+
+        # Só a alteração deste usuário é gravada; o nome é salvo uma única
+        # vez, quando ele entra na enquete
+        if tipo_anterior:
+            delta = {"op": "trocar", "de": tipo_anterior}
+        else:
+            delta = {"op": "entrar", "nome": None}
+        delta.update({"user_id": user_id, "categoria": tipo})
+        return (
+            f"✅ Você foi registrado como **{tipo}** {self.emojis[tipo]}!",
+            delta)
+
+    def get_guild(self):
+        """Servidor da enquete (resolvido de novo só se ainda for desconhecido)"""
+        if self.guild is None:
+            self.guild = channel_index.resolve(self.bot,
+                                               self.enquete_data['canal_id'])
+        return self.guild
+
+    async def gravar_votos(self, lote):
+        """Consumidor da FilaVotos: grava um lote de deltas em ordem"""
+        # Nomes de quem entrou resolvidos juntos (um lote do name_cache)
+        entradas = [d for d in lote if d['op'] == "entrar"]
+        if entradas:
+            try:
+                nomes = await name_cache.resolve_many(
+                    self.bot, self.get_guild(),
+                    [d['user_id'] for d in entradas])
+            except Exception as e:
+                print(f"Erro ao buscar nomes dos participantes: {e}")
+                nomes = {}
+            for delta in entradas:
+                user_id = delta['user_id']
+                delta['nome'] = nomes.get(user_id) or "Usuário não encontrado"
+                if user_id in self.user_votes:
+                    self.nomes_salvos.setdefault(user_id, delta['nome'])
+
+        # As tarefas começam na ordem do lote e entram assim no armazenamento
+        gravados = await asyncio.gather(*(self.salvar_voto(delta)
+                                          for delta in lote))
+        if not all(gravados) and self._recarga is None:
+            # Numa tarefa própria: o consumidor não pode esperar pela trava,
+            # que quem vota com a fila cheia segura enquanto espera espaço
+            self._recarga = asyncio.get_running_loop().create_task(
+                self.recarregar())
+
+    async def salvar_voto(self, delta):
+        """Persiste um voto como delta (entrar/sair/trocar) no armazenamento"""
         try:
-            # Preparar dados dos participantes com nomes do servidor
-            participantes_data = {}
-
-            for tipo, user_ids in self.votos.items():
-                participantes_data[tipo] = []
-                for user_id in user_ids:
-                    try:
-                        # Buscar o servidor correto de forma mais robusta
-                        guild = None
-
-                        # Primeiro: tentar encontrar o servidor pelo canal onde foi criada a enquete
-                        for bot_guild in self.bot.guilds:
-                            for channel in bot_guild.channels:
-                                if channel.id == self.enquete_data['canal_id']:
-                                    guild = bot_guild
-                                    print(
-                                        f"🔍 Servidor encontrado: {guild.name} (ID: {guild.id})"
-                                    )
-                                    break
-                            if guild:
-                                break
-
-                        member = None
-                        nome_servidor = None
-
-                        if guild:
-                            member = guild.get_member(user_id)
-                            if member:
-                                print(
-                                    f"Membro encontrado: {member.name}, display_name: {member.display_name}, nick: {member.nick}"
-                                )
-                                # PRIORIDADE 1: Nickname específico do servidor (se existir)
-                                if member.nick:
-                                    nome_servidor = member.nick
-                                    print(
-                                        f"✅ Salvando NICKNAME DO SERVIDOR: '{member.nick}' para user {user_id}"
-                                    )
-                                # PRIORIDADE 2: Nome global do Discord (se não tiver nickname)
-                                else:
-                                    nome_servidor = member.global_name or member.name
-                                    print(
-                                        f"⚠️ Salvando nome global: '{nome_servidor}' para user {user_id} (SEM nickname no servidor)"
-                                    )
-                            else:
-                                print(
-                                    f"❌ Membro {user_id} não encontrado no servidor {guild.name}"
-                                )
-
-                        # Se não conseguiu pegar como membro, tentar como usuário global
-                        if not nome_servidor:
-                            user = self.bot.get_user(user_id)
-                            if not user:
-                                user = await self.bot.fetch_user(user_id)
-
-                            if user:
-                                nome_servidor = user.global_name or user.name
-                            else:
-                                nome_servidor = "Usuário não encontrado"
-
-                        # Salvar com informações detalhadas
-                        participante_info = {
-                            "user_id": user_id,
-                            "nome": nome_servidor,
-                            "nome_servidor":
-                            nome_servidor  # Campo específico para o nome no servidor
-                        }
-
-                        # Se encontrou o membro, salvar informações adicionais para debug
-                        if guild:
-                            member = guild.get_member(user_id)
-                            if member:
-                                participante_info["tem_nickname"] = bool(
-                                    member.nick)
-                                participante_info[
-                                    "nickname_atual"] = member.nick
-                                participante_info[
-                                    "nome_global"] = member.global_name or member.name
-
-                        participantes_data[tipo].append(participante_info)
-                        print(f"💾 Participante salvo: {participante_info}")
-
-                    except Exception as e:
-                        print(
-                            f"Erro ao buscar dados do usuário {user_id}: {e}")
-                        participantes_data[tipo].append({
-                            "user_id":
-                            user_id,
-                            "nome":
-                            "Usuário não encontrado",
-                            "nome_servidor":
-                            "Usuário não encontrado"
-                        })
-
-            # Atualizar no storage
-            self.storage.update_event_participants(
-                self.enquete_data['event_id'], participantes_data)
-
+            gravado = await self.storage.apply_participant_delta(
+                self.enquete_data['event_id'], delta)
         except Exception as e:
             print(f"Erro ao salvar participantes: {e}")
+            return False
+        if not gravado:
+            print(f"Voto recusado pelo armazenamento na enquete "
+                  f"{self.enquete_data['event_id']}: {delta['op']} de "
+                  f"{delta['user_id']} em {delta['categoria']}")
+        return gravado
+
+    async def recarregar(self):
+        """Refaz votos/user_votes com o que está salvo (após um voto recusado)"""
+        try:
+            while True:
+                # Sem a trava: a fila precisa esvaziar para o salvo alcançar
+                # a memória
+                await self.fila.join()
+                async with self.trava:
+                    # Votos que chegaram enquanto esperava: esperar de novo
+                    if not self.fila.vazia():
+                        continue
+                    evento = await self.storage.get_event_by_id(
+                        self.enquete_data['event_id'])
+                    if evento is None:
+                        return
+                    for tipo in self.votos:
+                        self.votos[tipo] = []
+                    self.user_votes.clear()
+                    self.nomes_salvos.clear()
+                    self.carregar_participantes(evento.get('participantes'))
+                    break
+        finally:
+            self._recarga = None
+        if self._ultima_interacao is not None:
+            self.editor.request()
 
     async def atualizar_botoes_followup(self, interaction):
+        """Agenda a atualização da mensagem (votos próximos viram uma edição)"""
+        self._ultima_interacao = interaction
+        if self.mensagem is None and interaction.message is not None:
+            # O clique já traz a mensagem da enquete
+            self.mensagem = interaction.message
+        self.editor.request()
+
+    async def editar_mensagem(self):
+        """Monta o embed e os botões com o estado atual e edita a mensagem"""
+        interaction = self._ultima_interacao
         try:
-            await asyncio.sleep(0.5)
-
             user_id = interaction.user.id
             user_selected_tipo = self.user_votes.get(user_id)
+            guild = self.get_guild() or interaction.guild
 
             # Atualizar labels dos botões
-            for item in self.children:
-                if isinstance(item, discord.ui.Button):
-                    tipo = item.custom_id.split('_')[1]
+            for botao in self.children:
+                if isinstance(botao, VotoEnquete):
+                    item = botao.item
+                    tipo = botao.tipo
                     atual = len(self.votos[tipo])
                     limite = self.limites[tipo]
                     item.label = f"{tipo} ({atual}/{limite})"
@@ -285,46 +657,20 @@ class EnqueteView(discord.ui.View):
 
                         if users:
                             for user_id in users:
-                                try:
-                                    # PRIORIDADE 1: Tentar buscar membro atual do servidor para pegar o nickname do servidor
-                                    member = interaction.guild.get_member(
-                                        user_id)
-                                    if member:
-                                        # PRIORIDADE 1: Nickname específico do servidor
-                                        if member.nick:
-                                            descricao += f"   • {member.nick}\n"
-                                            continue
-                                        # PRIORIDADE 2: Nome global do Discord
-                                        else:
-                                            descricao += f"   • {member.global_name or member.name}\n"
-                                            continue
-
-                                    # PRIORIDADE 2: Buscar dados salvos no evento (nickname que estava no servidor na época)
-                                    nome_salvo = None
-                                    event_data = self.storage.get_event_by_id(
-                                        self.enquete_data['event_id'])
-                                    if event_data and 'participantes' in event_data:
-                                        for participante in event_data[
-                                                'participantes'].get(tipo, []):
-                                            if participante.get(
-                                                    'user_id') == user_id:
-                                                nome_salvo = participante.get(
-                                                    'nome_servidor'
-                                                ) or participante.get('nome')
-                                                break
-
-                                    if nome_salvo:
-                                        descricao += f"   • {nome_salvo} (não está mais no servidor)\n"
-                                        continue
-
-                                    # PRIORIDADE 3: Último fallback se não conseguiu encontrar
-                                    descricao += f"   • Usuário saiu do servidor\n"
-
-                                except Exception as e:
-                                    print(
-                                        f"Erro ao buscar usuário {user_id}: {e}"
-                                    )
-                                    descricao += f"   • Usuário indisponível\n"
+                                # PRIORIDADE 1: Nome atual no servidor
+                                nome = name_cache.member_name(guild, user_id)
+                                if nome:
+                                    descricao += f"   • {nome}\n"
+                                    continue
+
+                                # PRIORIDADE 2: Nome salvo no evento (nickname que estava no servidor na época)
+                                nome_salvo = self.nomes_salvos.get(user_id)
+                                if nome_salvo:
+                                    descricao += f"   • {nome_salvo} (não está mais no servidor)\n"
+                                    continue
+
+                                # PRIORIDADE 3: Último fallback se não conseguiu encontrar
+                                descricao += f"   • Usuário saiu do servidor\n"
                         else:
                             descricao += "   • *Nenhum jogador registrado*\n"
 
@@ -333,11 +679,12 @@ class EnqueteView(discord.ui.View):
                 descricao += f"**Total de participantes:** {total_registrados}/{total_vagas} jogadores"
 
                 # Desabilitar todos os botões mantendo cores apropriadas
-                for item in self.children:
-                    if isinstance(item, discord.ui.Button):
+                for botao in self.children:
+                    if isinstance(botao, VotoEnquete):
+                        item = botao.item
                         item.disabled = True
                         # Manter verde para tipos que têm participantes
-                        tipo = item.custom_id.split('_')[1]
+                        tipo = botao.tipo
                         if len(self.votos.get(tipo, [])) > 0:
                             item.style = discord.ButtonStyle.success
                         else:
@@ -369,9 +716,9 @@ class EnqueteView(discord.ui.View):
                     "🎉 Evento finalizada! Todos os slots foram preenchidos.")
             else:
                 try:
-                    autor = interaction.guild.get_member(
-                        self.enquete_data['autor_id'])
-                    autor_nome = autor.display_name if autor else "Usuário não encontrado"
+                    autor_nome = name_cache.member_name(
+                        guild, self.enquete_data['autor_id']
+                    ) or "Usuário não encontrado"
                     embed.set_footer(
                         text=
                         f"Evento criada por {autor_nome} • Use /resultado_evento para detalhes"
@@ -380,16 +727,39 @@ class EnqueteView(discord.ui.View):
                     embed.set_footer(
                         text="Use /resultado_evento para detalhes")
 
-            # Buscar a mensagem original e editá-la
-            channel = interaction.guild.get_channel(
-                self.enquete_data['canal_id'])
-            message = await channel.fetch_message(
-                self.enquete_data['message_id'])
-            await message.edit(embed=embed, view=self)
+            await self.editar_via_handle(embed=embed, view=self)
 
         except Exception as e:
             print(f"Erro ao atualizar botões (followup): {e}")
 
+    async def editar_via_handle(self, **kwargs):
+        """Edita a mensagem da enquete sem buscá-la na API
+
+        Usa o handle guardado ou uma mensagem parcial montada com canal_id e
+        message_id; fetch_message só é feito se essa edição falhar.
+        """
+        mensagem = self.mensagem
+        if mensagem is None:
+            channel = self.bot.get_channel(self.enquete_data['canal_id'])
+            if channel is not None:
+                mensagem = channel.get_partial_message(
+                    self.enquete_data['message_id'])
+        if mensagem is not None:
+            try:
+                self.mensagem = await mensagem.edit(**kwargs)
+                return
+            except discord.NotFound:
+                raise
+            except discord.HTTPException as e:
+                print(f"Edição direta da enquete falhou ({e}), buscando a mensagem")
+
+        EditScheduler.total_fetches += 1
+        channel = self.bot.get_channel(
+            self.enquete_data['canal_id']) or await self.bot.fetch_channel(
+                self.enquete_data['canal_id'])
+        message = await channel.fetch_message(self.enquete_data['message_id'])
+        self.mensagem = await message.edit(**kwargs)
+
 
 class EnqueteModal(discord.ui.Modal):
 
@@ -458,9 +828,6 @@ class EnqueteModal(discord.ui.Modal):
 
     async def criar_enquete(self, interaction, limites):
         try:
-            # Limpar memória de enquetes antigas
-            self.cog_instance.active_views.clear()
-
             # Gerar ID único para o evento
             event_id = str(uuid.uuid4())
 
@@ -531,19 +898,21 @@ class EnqueteModal(discord.ui.Modal):
             # Criar view com botões
             view = EnqueteView(interaction.client, enquete_data, limites)
 
+            # No cache antes de os botões existirem: cliques que chegam
+            # antes do evento ser gravado já encontram a enquete
+            enquetes_cache.put(view)
+
             # Enviar no canal
             mensagem = await interaction.channel.send(embed=embed, view=view)
 
             # Atualizar dados com ID da mensagem
             enquete_data['message_id'] = mensagem.id
+            if view.mensagem is None:
+                view.mensagem = mensagem
 
             # Salvar no JSON
-            storage = EventStorage()
-            storage.save_event(enquete_data)
-
-            # Salvar view na memória
-            self.cog_instance.active_views[mensagem.id] = view
-            view.enquete_data = enquete_data
+            storage = get_async_event_storage()
+            await storage.save_event(enquete_data)
 
             await interaction.response.send_message(
                 "✅ Evento criada com sucesso!", ephemeral=True)
@@ -564,23 +933,8 @@ class EventSelectView(discord.ui.View):
         # Criar dropdown com os eventos
         options = []
         for i, event in enumerate(events_data):
-            # Formatar data para o label
-            try:
-                # Verificar se já temos data formatada do Brasil
-                if 'data_criacao_brasilia' in event:
-                    data_formatada = event['data_criacao_brasilia'].split(
-                        ' às ')[1].replace(' (Brasília)', '')
-                    data_formatada = event['data_criacao_brasilia'].split(
-                        ' às ')[0] + " " + data_formatada[:5]
-                else:
-                    # Fallback para datas antigas
-                    dt = datetime.fromisoformat(event['data_criacao'].replace(
-                        'Z', '+00:00'))
-                    brasilia_tz = pytz.timezone('America/Sao_Paulo')
-                    dt_brasilia = dt.astimezone(brasilia_tz)
-                    data_formatada = dt_brasilia.strftime("%d/%m %H:%M")
-            except:
-                data_formatada = "Data inválida"
+            # Data já formatada pelo armazenamento (esquema de eventos v2)
+            data_formatada = event.get('data_curta', "Data inválida")
 
             # Contar participantes
             total_participantes = 0
@@ -620,20 +974,7 @@ class EventSelectView(discord.ui.View):
                 color=discord.Color.green())
 
             # Informações básicas
-            try:
-                # Verificar se já temos data formatada do Brasil
-                if 'data_criacao_brasilia' in event:
-                    data_formatada = event['data_criacao_brasilia']
-                else:
-                    # Fallback para datas antigas
-                    dt = datetime.fromisoformat(event['data_criacao'].replace(
-                        'Z', '+00:00'))
-                    brasilia_tz = pytz.timezone('America/Sao_Paulo')
-                    dt_brasilia = dt.astimezone(brasilia_tz)
-                    data_formatada = dt_brasilia.strftime(
-                        "%d/%m/%Y às %H:%M (Brasília)")
-            except:
-                data_formatada = "Data inválida"
+            data_formatada = event.get('data_completa', "Data inválida")
 
             descricao = f"**📅 Horário:** {event.get('horario', 'Não especificado')}\n"
             descricao += f"**📜 {event.get('levar', 'Não especificado')}**\n"
@@ -665,15 +1006,10 @@ class EventSelectView(discord.ui.View):
                             try:
                                 # PRIORIDADE 1: Nickname atual do servidor (display_name inclui nickname se houver)
                                 if user_id:
-                                    guild = interaction.guild
-                                    member = guild.get_member(user_id)
-                                    if member:
-                                        # PRIORIDADE 1: Nickname específico do servidor
-                                        if member.nick:
-                                            nome_display = member.nick
-                                        # PRIORIDADE 2: Nome global do Discord
-                                        else:
-                                            nome_display = member.global_name or member.name
+                                    nome_atual = name_cache.member_name(
+                                        interaction.guild, user_id)
+                                    if nome_atual:
+                                        nome_display = nome_atual
                                     else:
                                         # PRIORIDADE 2: Nome salvo no evento (nickname que tinha na época)
                                         nome_salvo = participante.get(
@@ -730,26 +1066,8 @@ class EventDeleteSelect(discord.ui.Select):
             if len(titulo) > 50:
                 titulo = titulo[:47] + "..."
 
-            # Formatar data
-            if 'data_criacao_brasilia' in evento:
-                try:
-                    data_formatada = evento['data_criacao_brasilia'].split(
-                        ' às ')[1].replace(' (Brasília)', '')
-                    data_formatada = evento['data_criacao_brasilia'].split(
-                        ' às ')[0] + " " + data_formatada[:5]
-                except:
-                    data_formatada = 'Data inválida'
-            elif evento.get('data_criacao'):
-                try:
-                    dt = datetime.fromisoformat(evento['data_criacao'].replace(
-                        'Z', '+00:00'))
-                    brasilia_tz = pytz.timezone('America/Sao_Paulo')
-                    dt_brasilia = dt.astimezone(brasilia_tz)
-                    data_formatada = dt_brasilia.strftime('%d/%m %H:%M')
-                except:
-                    data_formatada = 'Data inválida'
-            else:
-                data_formatada = 'Sem data'
+            # Data já formatada pelo armazenamento
+            data_formatada = evento.get('data_curta', 'Sem data')
 
             options.append(
                 discord.SelectOption(
@@ -781,20 +1099,7 @@ class EventDeleteSelect(discord.ui.Select):
 
         for evento in selected_eventos:
             titulo = evento.get('titulo', 'Sem título')
-            if 'data_criacao_brasilia' in evento:
-                data_formatada = evento['data_criacao_brasilia']
-            elif evento.get('data_criacao'):
-                try:
-                    dt = datetime.fromisoformat(evento['data_criacao'].replace(
-                        'Z', '+00:00'))
-                    brasilia_tz = pytz.timezone('America/Sao_Paulo')
-                    dt_brasilia = dt.astimezone(brasilia_tz)
-                    data_formatada = dt_brasilia.strftime(
-                        '%d/%m/%Y às %H:%M (Brasília)')
-                except:
-                    data_formatada = 'Data inválida'
-            else:
-                data_formatada = 'Sem data'
+            data_formatada = evento.get('data_completa', 'Sem data')
 
             embed.add_field(
                 name=f"📅 {titulo}",
@@ -823,9 +1128,9 @@ class DeleteConfirmView(discord.ui.View):
                        style=discord.ButtonStyle.danger)
     async def confirm_delete(self, interaction: discord.Interaction,
                              button: discord.ui.Button):
-        storage = EventStorage()
+        storage = get_async_event_storage()
 
-        if storage.delete_events(self.event_ids):
+        if await storage.delete_events(self.event_ids):
             embed = discord.Embed(
                 title="✅ Eventos Deletados",
                 description=
@@ -872,8 +1177,110 @@ class Enquete(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
-        self.active_views = {}  # {message_id: EnqueteView}
-        self.storage = EventStorage()
+        # Mensagens de antes dos botões roteados (custom_id vote_*), ainda
+        # abertas: o primeiro clique migra a mensagem para o novo formato
+        self.enquetes_legadas = {}  # {message_id: event_id}
+        self.storage = get_async_event_storage()
+
+    async def cog_load(self):
+        # Apenas o backend JSON em modo journal precisa de consolidação
+        if getattr(self.storage.storage, 'journal', False):
+            self.compactar_journal.start()
+        # Cog recarregado com o bot já conectado: montar o índice agora
+        if self.bot.is_ready():
+            channel_index.rebuild(self.bot.guilds)
+        # Um único roteador para os botões de todas as enquetes
+        self.bot.add_dynamic_items(VotoEnquete)
+        await self.carregar_enquetes_ativas()
+
+    async def carregar_enquetes_ativas(self):
+        """Anota as enquetes abertas cujos botões ainda usam vote_*"""
+        try:
+            enquetes = await self.storage.get_active_polls()
+        except Exception as e:
+            print(f"Erro ao carregar enquetes ativas: {e}")
+            return
+        for enquete in enquetes:
+            self.enquetes_legadas[enquete['message_id']] = enquete['event_id']
+
+    @commands.Cog.listener()
+    async def on_interaction(self, interaction):
+        # Botões vote_* não têm roteador: resolver o evento pela mensagem
+        if (interaction.type != discord.InteractionType.component or
+                interaction.message is None):
+            return
+        custom_id = (interaction.data or {}).get('custom_id', '')
+        event_id = self.enquetes_legadas.get(interaction.message.id)
+        if event_id is None or not custom_id.startswith('vote_'):
+            return
+
+        view = await enquetes_cache.get(self.bot, event_id)
+        tipo = custom_id.split('_', 1)[1]
+        if view is None or tipo not in view.votos:
+            await interaction.response.send_message(
+                "❌ Esta enquete não está mais disponível!", ephemeral=True)
+            return
+        if view.mensagem is None:
+            view.mensagem = interaction.message
+        await view.processar_voto(interaction, tipo)
+
+        # A edição seguinte já envia os botões com o novo custom_id (clique
+        # recusado não agenda edição: agendar mesmo assim); feita a edição,
+        # os próximos cliques chegam pelo VotoEnquete
+        if view._ultima_interacao is not interaction:
+            await view.atualizar_botoes_followup(interaction)
+        await view.editor.flush()
+        self.enquetes_legadas.pop(interaction.message.id, None)
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        channel_index.rebuild(self.bot.guilds)
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild):
+        channel_index.add_guild(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        channel_index.remove_guild(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_create(self, channel):
+        channel_index.add_channel(channel)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        channel_index.remove_channel(channel)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        name_cache.update_member(member)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before, after):
+        name_cache.update_member(after)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        name_cache.remove_member(member)
+
+    @commands.Cog.listener()
+    async def on_user_update(self, before, after):
+        name_cache.update_user(after)
+
+    async def cog_unload(self):
+        self.bot.remove_dynamic_items(VotoEnquete)
+        if self.compactar_journal.is_running():
+            self.compactar_journal.cancel()
+            await self.storage.compact_journal(force=True)
+
+    @tasks.loop(seconds=30)
+    async def compactar_journal(self):
+        """Consolida o journal de eventos quando passa do limite de tamanho/idade"""
+        try:
+            await self.storage.compact_journal()
+        except Exception as e:
+            print(f"Erro na consolidação do journal: {e}")
 
     @app_commands.command(name="criar_evento_boss",
                           description="Criar uma nova enquete Eventos")
@@ -888,8 +1295,6 @@ class Enquete(commands.Cog):
                 ephemeral=True)
             return
 
-        # Limpar memória antes de criar nova enquete
-        self.active_views.clear()
         modal = EnqueteModal(self)
         await interaction.response.send_modal(modal)
 
@@ -908,7 +1313,7 @@ class Enquete(commands.Cog):
             return
 
         # Buscar todos os eventos
-        todos_eventos = self.storage.get_all_events()
+        todos_eventos = await self.storage.get_all_events()
 
         if not todos_eventos:
             embed = discord.Embed(
@@ -920,7 +1325,7 @@ class Enquete(commands.Cog):
             return
 
         # Ordenar eventos do mais recente para o mais antigo
-        todos_eventos.sort(key=lambda x: x.get('data_criacao', ''),
+        todos_eventos.sort(key=lambda x: x.get('criado_em') or 0,
                            reverse=True)
 
         # Limitar a 25 eventos (limite do Discord)
@@ -962,7 +1367,7 @@ class Enquete(commands.Cog):
             return
 
         # Buscar os últimos 5 eventos
-        recent_events = self.storage.get_recent_events(5)
+        recent_events = await self.storage.get_recent_events(5)
 
         if not recent_events:
             await interaction.response.send_message(
@@ -979,11 +1384,7 @@ class Enquete(commands.Cog):
         # Adicionar lista resumida dos eventos
         lista_eventos = ""
         for i, event in enumerate(recent_events, 1):
-            try:
-                dt = datetime.fromisoformat(event['data_criacao'])
-                data_formatada = dt.strftime("%d/%m %H:%M")
-            except:
-                data_formatada = "Data inválida"
+            data_formatada = event.get('data_curta', "Data inválida")
 
             # Contar participantes
             total_participantes = 0
@@ -1017,10 +1418,66 @@ class Enquete(commands.Cog):
                 ephemeral=True)
             return
 
-        self.active_views.clear()
+        # As enquetes voltam a ser lidas do armazenamento no próximo clique
+        enquetes_cache.clear()
         await interaction.response.send_message(
             "✅ Memória de enquetes limpa com sucesso!", ephemeral=True)
 
+    @app_commands.command(
+        name="metricas_eventos",
+        description="[ADMIN] Ver métricas de atualização das enquetes")
+    async def metricas_eventos(self, interaction: discord.Interaction):
+        # Verificar se é administrador
+        if not interaction.user.guild_permissions.administrator:
+            await interaction.response.send_message(
+                "❌ Apenas administradores podem usar este comando!",
+                ephemeral=True)
+            return
+
+        metricas = EditScheduler.metricas()
+        economia = (metricas['economizadas'] / metricas['votos'] *
+                    100) if metricas['votos'] else 0
+
+        embed = discord.Embed(title="📊 Métricas das Enquetes",
+                              color=discord.Color.blue())
+        embed.add_field(
+            name="✏️ Edições de mensagem",
+            value=f"**Votos recebidos:** {metricas['votos']}\n"
+            f"**Edições enviadas:** {metricas['edicoes']}\n"
+            f"**Edições economizadas:** {metricas['economizadas']} "
+            f"({economia:.0f}%)\n"
+            f"**fetch_message (fallback):** {metricas['fetches']}",
+            inline=False)
+        fila = FilaVotos.metricas()
+        embed.add_field(
+            name="⚡ Resposta e gravação dos votos",
+            value=f"**Resposta ao clique:** {fila['resposta_media_ms']:.1f} ms "
+            f"(p99 {fila['resposta_p99_ms']:.1f} ms)\n"
+            f"**Gravados:** {fila['gravados']}/{fila['enfileirados']} "
+            f"| **Na fila agora:** {fila['pendentes']}\n"
+            f"**Maior fila:** {fila['profundidade_max']} "
+            f"| **Esperas por fila cheia:** {fila['esperas']} "
+            f"(respondidas com defer: {fila['adiados']})",
+            inline=False)
+        cache = enquetes_cache.stats()
+        embed.add_field(
+            name="🗂️ Cache de enquetes",
+            value=f"**Em memória:** {cache['enquetes']}/{cache['tamanho']}\n"
+            f"**Acertos:** {cache['hits']}\n"
+            f"**Carregadas do armazenamento:** {cache['misses']}",
+            inline=False)
+        nomes = name_cache.stats()
+        embed.add_field(
+            name="🏷️ Cache de nomes",
+            value=f"**Membros em cache:** {nomes['membros']} "
+            f"({nomes['servidores']} servidores)\n"
+            f"**Acertos:** {nomes['hits']} | **Faltas:** {nomes['misses']}\n"
+            f"**query_members:** {nomes['queries']} | "
+            f"**fetch_user:** {nomes['fetches']}",
+            inline=False)
+        embed.set_footer(text="Desde a última inicialização do bot")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
     @app_commands.command(
         name="sync_comandos",
         description="[ADMIN] Forçar sincronização dos comandos slash")
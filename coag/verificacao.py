@@ -2,8 +2,11 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 import logging
+import os
 import re
-from verification_storage import VerificationStorage
+import tempfile
+from datetime import datetime
+from async_storage import get_async_verification_storage
 
 # Configurar logging específico para verificação
 logger = logging.getLogger('verificacao')
@@ -14,6 +17,9 @@ handler.setFormatter(formatter)
 logger.addHandler(handler)
 logger.setLevel(logging.INFO)
 
+# Verificações por página em /resultado_verificacao
+ITENS_POR_PAGINA_VERIFICACOES = 10
+
 
 class NicknameModal(discord.ui.Modal):
     """Modal para edição de nickname"""
@@ -60,13 +66,13 @@ class NicknameModal(discord.ui.Modal):
                 )
 
                 # Atualizar dados da verificação com nickname
-                storage = VerificationStorage()
-                existing_data = storage.get_verification_by_user(
+                storage = get_async_verification_storage()
+                existing_data = await storage.get_verification_by_user(
                     interaction.user.id)
                 if existing_data:
                     existing_data["nick_atual_servidor"] = new_nickname
                     existing_data["status"] = "nickname_definido"
-                    storage.save_verification(existing_data)
+                    await storage.save_verification(existing_data)
                 else:
                     # Criar novo registro se não existir
                     user_data = {
@@ -83,7 +89,7 @@ class NicknameModal(discord.ui.Modal):
                         "status":
                         "nickname_definido"
                     }
-                    storage.save_verification(user_data)
+                    await storage.save_verification(user_data)
 
                 # Criar embed de sucesso
                 embed = discord.Embed(
@@ -392,12 +398,13 @@ class VocacaoSelectView(discord.ui.View):
                 await interaction.response.edit_message(embed=embed, view=None)
 
                 # Salvar dados finais da verificação
-                storage = VerificationStorage()
-                existing_data = storage.get_verification_by_user(user.id)
+                storage = get_async_verification_storage()
+                existing_data = await storage.get_verification_by_user(
+                    user.id)
                 if existing_data:
                     existing_data["vocacao"] = vocacao_code
                     existing_data["status"] = "verificacao_concluida"
-                    storage.save_verification(existing_data)
+                    await storage.save_verification(existing_data)
                 else:
                     # Criar novo registro se não existir
                     user_data = {
@@ -408,7 +415,7 @@ class VocacaoSelectView(discord.ui.View):
                         "vocacao": vocacao_code,
                         "status": "verificacao_concluida"
                     }
-                    storage.save_verification(user_data)
+                    await storage.save_verification(user_data)
 
                 # Log de conclusão
                 logger.info(
@@ -517,7 +524,7 @@ class VerificationPanelView(discord.ui.View):
             )
 
             # Salvar dados iniciais da verificação
-            storage = VerificationStorage()
+            storage = get_async_verification_storage()
             user_data = {
                 "user_id": interaction.user.id,
                 "nick_discord": interaction.user.name,
@@ -528,7 +535,7 @@ class VerificationPanelView(discord.ui.View):
                 "vocacao": None,  # Será preenchido quando escolher vocação
                 "status": "verificacao_iniciada"
             }
-            storage.save_verification(user_data)
+            await storage.save_verification(user_data)
 
         except Exception as e:
             logger.error(
@@ -544,6 +551,151 @@ class VerificationPanelView(discord.ui.View):
         await interaction.response.send_modal(modal)
 
 
+class ResultadoVerificacaoView(discord.ui.View):
+    """Relatório paginado de verificações (mais recentes primeiro)
+
+    Cada página é buscada por cursor (timestamp, user_id), então trocar de
+    página lê só os registros exibidos.
+    """
+
+    def __init__(self, storage, stats, autor: discord.abc.User):
+        super().__init__(timeout=300)
+        self.storage = storage
+        self.stats = stats
+        self.autor = autor
+        self.pagina = 0
+        self.resultado = None
+
+    async def carregar(self, cursor=None, direction: str = "next"):
+        """Busca uma página no armazenamento e atualiza os botões"""
+        self.resultado = await self.storage.get_verifications_page(
+            ITENS_POR_PAGINA_VERIFICACOES, cursor, direction)
+        self.anterior.disabled = not self.resultado["tem_anterior"]
+        self.proxima.disabled = not self.resultado["tem_proxima"]
+
+    def build_embed(self) -> discord.Embed:
+        """Monta o embed da página atual"""
+        total = self.stats["total"]
+        total_paginas = max(
+            1, -(-total // ITENS_POR_PAGINA_VERIFICACOES))  # arredonda p/ cima
+
+        emoji_vocacoes = {
+            "EK": "🛡️",
+            "MS": "🔮",
+            "RP": "🏹",
+            "ED": "🌟",
+            "MK": "👊",
+            "Não selecionada": "❓"
+        }
+
+        # Criar lista formatada
+        lista_verificacoes = ""
+        inicio = self.pagina * ITENS_POR_PAGINA_VERIFICACOES
+        for i, verification in enumerate(self.resultado["verificacoes"],
+                                         inicio + 1):
+            data = verification.get('data', 'Data não disponível')
+            nick_discord = verification.get('nick_discord', 'N/A')
+            nick_servidor = verification.get('nick_atual_servidor',
+                                             'Não definido')
+            vocacao = verification.get('vocacao') or 'Não selecionada'
+            status = verification.get('status', 'desconhecido')
+
+            emoji_voc = emoji_vocacoes.get(vocacao, "❓")
+
+            # Status emoji
+            status_emoji = "✅" if status == "verificacao_concluida" else "⏳"
+
+            lista_verificacoes += f"{status_emoji} **{i}.** {nick_servidor or nick_discord}\n"
+            lista_verificacoes += f"      📅 **Data:** {data}\n"
+            lista_verificacoes += f"      🏷️ **Nick Discord:** {nick_discord}\n"
+            lista_verificacoes += f"      📝 **Nick Servidor:** {nick_servidor or 'Não definido'}\n"
+            lista_verificacoes += f"      {emoji_voc} **Vocação:** {vocacao}\n\n"
+
+        embed = discord.Embed(
+            title="📋 Lista Completa de Novos Membros Verificados",
+            description=f"**Total de verificações:** {total}\n\n" +
+            (lista_verificacoes or "Nenhum dado encontrado"),
+            color=discord.Color.green())
+
+        # Estatísticas por vocação
+        stats_text = ""
+        for vocacao, count in self.stats["vocacao"].items():
+            emoji = emoji_vocacoes.get(vocacao, "❓")
+            stats_text += f"{emoji} {vocacao}: {count}\n"
+
+        if stats_text:
+            embed.add_field(name="📊 Estatísticas por Vocação:",
+                            value=stats_text,
+                            inline=True)
+
+        # Status das verificações
+        status_text = ""
+        status_names = {
+            "verificacao_iniciada": "⏳ Iniciada",
+            "nickname_definido": "📝 Nick Definido",
+            "verificacao_concluida": "✅ Concluída"
+        }
+
+        for status, count in self.stats["status"].items():
+            status_display = status_names.get(status, status)
+            status_text += f"{status_display}: {count}\n"
+
+        if status_text:
+            embed.add_field(name="📈 Status das Verificações:",
+                            value=status_text,
+                            inline=True)
+
+        # Verificações pelo dia da última atualização (últimos 7 dias)
+        por_dia = self.stats["atualizadas_por_dia"]
+        dias = []
+        for dia in sorted(por_dia, reverse=True):
+            try:
+                dias.append((datetime.strptime(dia, "%Y-%m-%d"), dia))
+            except ValueError:
+                continue  # chave fora do formato AAAA-MM-DD
+            if len(dias) == 7:
+                break
+        dias_text = "".join(f"{data:%d/%m/%Y}: {por_dia[dia]}\n"
+                            for data, dia in dias)
+
+        if dias_text:
+            embed.add_field(name="📅 Última Atualização por Dia:",
+                            value=dias_text,
+                            inline=True)
+
+        embed.set_footer(
+            text=
+            f"📄 Página {self.pagina + 1}/{total_paginas} • Comando executado por {self.autor.display_name}",
+            icon_url=self.autor.display_avatar.url
+            if self.autor.display_avatar else None)
+        return embed
+
+    @discord.ui.button(label="Anterior",
+                       style=discord.ButtonStyle.secondary,
+                       emoji="◀️")
+    async def anterior(self, interaction: discord.Interaction,
+                       button: discord.ui.Button):
+        """Página com verificações mais recentes"""
+        await self.carregar(self.resultado["cursor_inicio"], "prev")
+        # Sem mais páginas antes desta: é a primeira (mesmo se entraram
+        # registros novos enquanto o relatório estava aberto)
+        self.pagina = max(0, self.pagina -
+                          1) if self.resultado["tem_anterior"] else 0
+        await interaction.response.edit_message(embed=self.build_embed(),
+                                                view=self)
+
+    @discord.ui.button(label="Próxima",
+                       style=discord.ButtonStyle.secondary,
+                       emoji="▶️")
+    async def proxima(self, interaction: discord.Interaction,
+                      button: discord.ui.Button):
+        """Página com verificações mais antigas"""
+        await self.carregar(self.resultado["cursor_fim"])
+        self.pagina += 1
+        await interaction.response.edit_message(embed=self.build_embed(),
+                                                view=self)
+
+
 class Verificacao(commands.Cog):
     """Cog para sistema de verificação de novos membros"""
 
@@ -556,6 +708,12 @@ class Verificacao(commands.Cog):
         self.bot.add_view(VerificationPanelView())
         logger.info("Views persistentes de verificação configuradas")
 
+    async def cog_load(self):
+        # Confere (e corrige) os contadores de estatísticas ao iniciar
+        storage = get_async_verification_storage()
+        if not await storage.check_stats():
+            logger.warning("Estatísticas de verificação recalculadas")
+
     @app_commands.command(
         name="criar_painel_verificacao",
         description="[ADMIN] Criar painel de verificação para novos membros")
@@ -729,10 +887,11 @@ class Verificacao(commands.Cog):
             return
 
         try:
-            storage = VerificationStorage()
-            all_verifications = storage.get_all_verifications()
+            storage = get_async_verification_storage()
+            # Contadores mantidos a cada gravação: leitura sem varrer registros
+            stats = await storage.get_verification_stats()
 
-            if not all_verifications:
+            if not stats["total"]:
                 embed = discord.Embed(
                     title="📋 Nenhuma Verificação Encontrada",
                     description=
@@ -742,116 +901,91 @@ class Verificacao(commands.Cog):
                                                         ephemeral=True)
                 return
 
-            # Ordenar por data (mais recente primeiro)
-            sorted_verifications = sorted(all_verifications,
-                                          key=lambda x: x.get('timestamp', ''),
-                                          reverse=True)
-
-            # Criar embed principal
-            embed = discord.Embed(
-                title="📋 Lista Completa de Novos Membros Verificados",
-                description=
-                f"**Total de verificações:** {len(sorted_verifications)}\n\n",
-                color=discord.Color.green())
-
-            # Criar lista formatada
-            lista_verificacoes = ""
-            emoji_vocacoes = {
-                "EK": "🛡️",
-                "MS": "🔮",
-                "RP": "🏹",
-                "ED": "🌟",
-                "MK": "👊",
-                "Não selecionada": "❓"
-            }
-
-            for i, verification in enumerate(sorted_verifications, 1):
-                data = verification.get('data', 'Data não disponível')
-                nick_discord = verification.get('nick_discord', 'N/A')
-                nick_servidor = verification.get('nick_atual_servidor',
-                                                 'Não definido')
-                vocacao = verification.get('vocacao', 'Não selecionada')
-                status = verification.get('status', 'desconhecido')
-
-                emoji_voc = emoji_vocacoes.get(vocacao, "❓")
-
-                # Status emoji
-                status_emoji = "✅" if status == "verificacao_concluida" else "⏳"
-
-                lista_verificacoes += f"{status_emoji} **{i}.** {nick_servidor or nick_discord}\n"
-                lista_verificacoes += f"      📅 **Data:** {data}\n"
-                lista_verificacoes += f"      🏷️ **Nick Discord:** {nick_discord}\n"
-                lista_verificacoes += f"      📝 **Nick Servidor:** {nick_servidor or 'Não definido'}\n"
-                lista_verificacoes += f"      {emoji_voc} **Vocação:** {vocacao}\n\n"
-
-                # Dividir em chunks se ficar muito longo
-                if len(lista_verificacoes
-                       ) > 3500:  # Deixar espaço para outros campos
-                    break
-
-            # Se a lista foi truncada
-            if len(sorted_verifications) > i:
-                lista_verificacoes += f"... e mais {len(sorted_verifications) - i} verificações.\n"
-                lista_verificacoes += f"*Lista truncada devido ao limite de caracteres.*"
-
-            embed.add_field(name="👥 Membros Verificados:",
-                            value=lista_verificacoes if lista_verificacoes else
-                            "Nenhum dado encontrado",
-                            inline=False)
+            # Só a primeira página é buscada; as demais vêm pelos botões
+            view = ResultadoVerificacaoView(storage, stats, interaction.user)
+            await view.carregar()
+            await interaction.response.send_message(embed=view.build_embed(),
+                                                    view=view,
+                                                    ephemeral=True)
 
-            # Estatísticas por vocação
-            stats_vocacoes = {}
-            stats_status = {}
-
-            for verification in sorted_verifications:
-                vocacao = verification.get('vocacao', 'Não selecionada')
-                status = verification.get('status', 'desconhecido')
-
-                stats_vocacoes[vocacao] = stats_vocacoes.get(vocacao, 0) + 1
-                stats_status[status] = stats_status.get(status, 0) + 1
-
-            # Adicionar estatísticas
-            stats_text = ""
-            for vocacao, count in stats_vocacoes.items():
-                emoji = emoji_vocacoes.get(vocacao, "❓")
-                stats_text += f"{emoji} {vocacao}: {count}\n"
-
-            if stats_text:
-                embed.add_field(name="📊 Estatísticas por Vocação:",
-                                value=stats_text,
-                                inline=True)
-
-            # Status das verificações
-            status_text = ""
-            status_names = {
-                "verificacao_iniciada": "⏳ Iniciada",
-                "nickname_definido": "📝 Nick Definido",
-                "verificacao_concluida": "✅ Concluída"
-            }
+        except Exception as e:
+            logger.error(f"Erro ao buscar resultados de verificação: {e}")
+            await interaction.response.send_message(
+                "❌ Erro ao carregar dados de verificação. Verifique os logs.",
+                ephemeral=True)
 
-            for status, count in stats_status.items():
-                status_display = status_names.get(status, status)
-                status_text += f"{status_display}: {count}\n"
+    @app_commands.command(
+        name="exportar_verificacoes",
+        description="[ADMIN] Exportar todas as verificações (JSONL ou CSV)")
+    @app_commands.describe(formato="Formato do arquivo (padrão: jsonl)")
+    @app_commands.choices(formato=[
+        app_commands.Choice(name="JSONL", value="jsonl"),
+        app_commands.Choice(name="CSV", value="csv")
+    ])
+    async def exportar_verificacoes(self,
+                                    interaction: discord.Interaction,
+                                    formato: str = "jsonl"):
+        """Comando para exportar as verificações em um arquivo"""
 
-            if status_text:
-                embed.add_field(name="📈 Status das Verificações:",
-                                value=status_text,
-                                inline=True)
+        # Verificar permissões
+        if not interaction.user.guild_permissions.administrator:
+            await interaction.response.send_message(
+                "❌ Apenas administradores podem usar este comando!",
+                ephemeral=True)
+            return
 
-            embed.set_footer(
-                text=
-                f"💾 Dados salvos em verificacao.json • Comando executado por {interaction.user.display_name}",
-                icon_url=interaction.user.display_avatar.url
-                if interaction.user.display_avatar else None)
+        await interaction.response.defer(ephemeral=True)
+        try:
+            storage = get_async_verification_storage()
+            with tempfile.TemporaryDirectory() as pasta:
+                caminho = os.path.join(pasta, f"verificacoes.{formato}")
+                total = await storage.export_verifications(caminho, formato)
+                await interaction.followup.send(
+                    f"📦 {total} verificações exportadas.",
+                    file=discord.File(caminho),
+                    ephemeral=True)
+            logger.info(
+                f"Verificações exportadas ({total}, {formato}) por {interaction.user.id}"
+            )
+        except Exception as e:
+            logger.error(f"Erro ao exportar verificações: {e}")
+            await interaction.followup.send(
+                "❌ Erro ao exportar verificações. Verifique os logs.",
+                ephemeral=True)
 
-            await interaction.response.send_message(embed=embed,
-                                                    ephemeral=True)
+    @app_commands.command(
+        name="importar_verificacoes",
+        description="[ADMIN] Importar verificações de um arquivo JSONL ou CSV")
+    @app_commands.describe(
+        arquivo="Arquivo .jsonl ou .csv (registros existentes são substituídos)")
+    async def importar_verificacoes(self, interaction: discord.Interaction,
+                                    arquivo: discord.Attachment):
+        """Comando para importar verificações em massa"""
 
-        except Exception as e:
-            logger.error(f"Erro ao buscar resultados de verificação: {e}")
+        # Verificar permissões
+        if not interaction.user.guild_permissions.administrator:
             await interaction.response.send_message(
-                "❌ Erro ao carregar dados de verificação. Verifique os logs.",
+                "❌ Apenas administradores podem usar este comando!",
+                ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True)
+        try:
+            storage = get_async_verification_storage()
+            with tempfile.TemporaryDirectory() as pasta:
+                caminho = os.path.join(pasta, os.path.basename(arquivo.filename))
+                await arquivo.save(caminho)
+                total = await storage.import_verifications(caminho)
+            await interaction.followup.send(
+                f"✅ {total} verificações importadas de `{arquivo.filename}`.",
                 ephemeral=True)
+            logger.info(
+                f"Verificações importadas ({total}) de {arquivo.filename} por {interaction.user.id}"
+            )
+        except Exception as e:
+            logger.error(f"Erro ao importar verificações: {e}")
+            await interaction.followup.send(
+                f"❌ Erro ao importar verificações: {e}", ephemeral=True)
 
 
 async def setup(bot):
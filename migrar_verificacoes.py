@@ -0,0 +1,43 @@
+"""Importação/exportação em massa das verificações
+
+Uso:
+    python migrar_verificacoes.py exportar backup.jsonl
+    python migrar_verificacoes.py importar membros.csv
+
+O formato (jsonl ou csv) vem da extensão do arquivo ou de --formato. O
+backend segue VERIFICATION_STORAGE_BACKEND, como no bot.
+"""
+import argparse
+import sys
+import time
+
+from verification_storage import get_verification_storage
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Importa/exporta verificações em JSONL ou CSV")
+    parser.add_argument("acao", choices=["importar", "exportar"])
+    parser.add_argument("arquivo")
+    parser.add_argument("--formato", choices=["jsonl", "csv"])
+    args = parser.parse_args(argv)
+
+    storage = get_verification_storage()
+    inicio = time.perf_counter()
+    try:
+        if args.acao == "importar":
+            total = storage.import_verifications(args.arquivo, args.formato)
+            print(f"{total} verificações importadas de {args.arquivo}", end="")
+        else:
+            total = storage.export_verifications(args.arquivo, args.formato)
+            print(f"{total} verificações exportadas para {args.arquivo}",
+                  end="")
+    except Exception as e:
+        print(f"Erro ao {args.acao} verificações: {e}")
+        return 1
+    print(f" em {time.perf_counter() - inicio:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
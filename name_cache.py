@@ -0,0 +1,230 @@
+"""Cache dos nomes de exibição dos membros
+
+Resolve "nickname, senão nome global, senão nome de usuário" uma vez por
+usuário/servidor. Cada servidor tem seu próprio limite de entradas e todas
+expiram depois de NAME_CACHE_TTL segundos. Quem saiu do servidor ou não
+existe mais fica num cache negativo, para não repetir chamadas à API. Os
+eventos do gateway (on_member_update, on_user_update, on_member_remove)
+atualizam as entradas: ver os listeners do cog de enquetes.
+
+Usuários desconhecidos pedidos ao mesmo tempo são resolvidos em lote: uma
+consulta guild.query_members(user_ids=...) para cada 100 IDs e, para quem
+não está no servidor, fetch_user com concorrência limitada.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+import discord
+
+NAME_CACHE_TTL = float(os.getenv("NAME_CACHE_TTL", 600))
+NAME_CACHE_NEGATIVE_TTL = float(os.getenv("NAME_CACHE_NEGATIVE_TTL", 300))
+NAME_CACHE_MAX_PER_GUILD = int(os.getenv("NAME_CACHE_MAX_PER_GUILD", 5000))
+# Janela em que os pedidos de nomes desconhecidos são juntados num lote
+NAME_BATCH_WINDOW = float(os.getenv("NAME_BATCH_WINDOW_MS", 20)) / 1000
+# fetch_user simultâneos (o discord.py cuida dos buckets de rate limit)
+NAME_FETCH_CONCURRENCY = int(os.getenv("NAME_FETCH_CONCURRENCY", 4))
+QUERY_MEMBERS_MAX = 100  # IDs por query_members (limite do Discord)
+
+
+def display_name(pessoa) -> str:
+    """Nickname do servidor, senão nome global, senão nome de usuário"""
+    return (getattr(pessoa, 'nick', None) or pessoa.global_name or
+            pessoa.name)
+
+
+class NameCache:
+    """Nomes por servidor (membros) e globais (usuários), com TTL e limite"""
+
+    def __init__(self,
+                 ttl: float = NAME_CACHE_TTL,
+                 negative_ttl: float = NAME_CACHE_NEGATIVE_TTL,
+                 max_per_guild: int = NAME_CACHE_MAX_PER_GUILD,
+                 batch_window: float = NAME_BATCH_WINDOW,
+                 fetch_concurrency: int = NAME_FETCH_CONCURRENCY):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_per_guild = max_per_guild
+        self.batch_window = batch_window
+        self._semaforo = asyncio.Semaphore(fetch_concurrency)
+        # Lote em formação por servidor: {guild_id: {user_id: Future}}
+        self._pendentes: Dict[Any, Dict[int, asyncio.Future]] = {}
+        self._tarefas = set()
+        # {guild_id: {user_id: (nome ou None se não é membro, expira_em)}}
+        self._membros: Dict[int, OrderedDict] = {}
+        # {user_id: (nome global ou None se o usuário não existe, expira_em)}
+        self._usuarios: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0  # chamadas fetch_user
+        self.queries = 0  # chamadas query_members
+
+    def _guardar(self, tabela: OrderedDict, chave, nome: Optional[str]):
+        validade = self.ttl if nome is not None else self.negative_ttl
+        tabela[chave] = (nome, time.monotonic() + validade)
+        tabela.move_to_end(chave)
+        while len(tabela) > self.max_per_guild:
+            tabela.popitem(last=False)
+
+    def _consultar(self, tabela: OrderedDict, chave):
+        """(True, nome) se há entrada válida; (False, None) se expirou/faltou"""
+        entrada = tabela.get(chave)
+        if entrada is None:
+            return False, None
+        if entrada[1] < time.monotonic():
+            del tabela[chave]
+            return False, None
+        return True, entrada[0]
+
+    def member_name(self, guild, user_id: int) -> Optional[str]:
+        """Nome atual do membro no servidor, ou None se ele não está lá"""
+        if guild is None:
+            return None
+        membros = self._membros.setdefault(guild.id, OrderedDict())
+        achou, nome = self._consultar(membros, user_id)
+        if achou:
+            self.hits += 1
+            return nome
+        self.misses += 1
+        member = guild.get_member(user_id)
+        nome = display_name(member) if member else None
+        self._guardar(membros, user_id, nome)
+        return nome
+
+    async def resolve(self, bot, guild, user_id: int) -> Optional[str]:
+        """Nome no servidor; fora dele, o nome global
+
+        Sem o nome em cache, o pedido entra no lote do servidor (ver
+        resolve_many) em vez de virar uma chamada à API só para ele.
+        """
+        nome = self.member_name(guild, user_id)
+        if nome:
+            return nome
+
+        achou, nome = self._consultar(self._usuarios, user_id)
+        if achou:
+            self.hits += 1
+            return nome
+        self.misses += 1
+
+        user = bot.get_user(user_id)
+        if user is not None:
+            nome = display_name(user)
+            self._guardar(self._usuarios, user_id, nome)
+            return nome
+        return await self._agendar(bot, guild, user_id)
+
+    async def resolve_many(self, bot, guild,
+                           user_ids: Iterable[int]) -> Dict[int, Optional[str]]:
+        """Nomes de vários usuários; os desconhecidos vão juntos num lote"""
+        ids = list(dict.fromkeys(user_ids))
+        nomes = await asyncio.gather(*(self.resolve(bot, guild, user_id)
+                                       for user_id in ids))
+        return dict(zip(ids, nomes))
+
+    def _agendar(self, bot, guild, user_id: int) -> asyncio.Future:
+        """Futuro do nome do usuário no lote em formação do servidor"""
+        chave = guild.id if guild is not None else None
+        pendentes = self._pendentes.setdefault(chave, {})
+        futuro = pendentes.get(user_id)
+        if futuro is None:
+            loop = asyncio.get_running_loop()
+            futuro = loop.create_future()
+            pendentes[user_id] = futuro
+            if len(pendentes) == 1:
+                tarefa = loop.create_task(self._lote(bot, guild, chave))
+                self._tarefas.add(tarefa)
+                tarefa.add_done_callback(self._tarefas.discard)
+        return futuro
+
+    async def _lote(self, bot, guild, chave):
+        await asyncio.sleep(self.batch_window)
+        pendentes = self._pendentes.pop(chave, {})
+        try:
+            nomes = await self._buscar(bot, guild, list(pendentes))
+        except Exception as e:
+            print(f"Erro ao resolver nomes em lote: {e}")
+            nomes = {}
+        for user_id, futuro in pendentes.items():
+            if not futuro.done():
+                futuro.set_result(nomes.get(user_id))
+
+    async def _buscar(self, bot, guild,
+                      user_ids: List[int]) -> Dict[int, Optional[str]]:
+        """Membros via query_members (100 por vez); o resto via fetch_user"""
+        nomes = {}
+        if guild is not None and hasattr(guild, 'query_members'):
+            membros = self._membros.setdefault(guild.id, OrderedDict())
+            for i in range(0, len(user_ids), QUERY_MEMBERS_MAX):
+                lote = user_ids[i:i + QUERY_MEMBERS_MAX]
+                self.queries += 1
+                try:
+                    encontrados = await guild.query_members(
+                        user_ids=lote, limit=len(lote), cache=True)
+                except Exception as e:
+                    print(f"Erro ao consultar membros do servidor: {e}")
+                    continue
+                for member in encontrados:
+                    nomes[member.id] = display_name(member)
+                    self._guardar(membros, member.id, nomes[member.id])
+                for user_id in lote:
+                    if user_id not in nomes:
+                        self._guardar(membros, user_id, None)
+
+        faltam = [user_id for user_id in user_ids if user_id not in nomes]
+        globais = await asyncio.gather(*(self._fetch_user(bot, user_id)
+                                         for user_id in faltam))
+        nomes.update(zip(faltam, globais))
+        return nomes
+
+    async def _fetch_user(self, bot, user_id: int) -> Optional[str]:
+        async with self._semaforo:
+            self.fetches += 1
+            try:
+                user = await bot.fetch_user(user_id)
+            except discord.NotFound:
+                user = None
+            except discord.HTTPException as e:
+                # Falha temporária: não guardar no cache negativo
+                print(f"Erro ao buscar dados do usuário {user_id}: {e}")
+                return None
+        nome = display_name(user) if user else None
+        self._guardar(self._usuarios, user_id, nome)
+        return nome
+
+    def update_member(self, member):
+        """Membro entrou ou mudou de nickname (on_member_join/update)"""
+        membros = self._membros.setdefault(member.guild.id, OrderedDict())
+        self._guardar(membros, member.id, display_name(member))
+
+    def remove_member(self, member):
+        """Membro saiu do servidor (on_member_remove): entrada negativa"""
+        membros = self._membros.setdefault(member.guild.id, OrderedDict())
+        self._guardar(membros, member.id, None)
+
+    def update_user(self, user):
+        """Nome global mudou (on_user_update)"""
+        self._guardar(self._usuarios, user.id, display_name(user))
+        # Quem não tem nickname exibe o nome global em todos os servidores
+        for membros in self._membros.values():
+            membros.pop(user.id, None)
+
+    def clear(self):
+        self._membros.clear()
+        self._usuarios.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "servidores": len(self._membros),
+            "membros": sum(len(m) for m in self._membros.values()),
+            "usuarios": len(self._usuarios),
+            "hits": self.hits,
+            "misses": self.misses,
+            "fetches": self.fetches,
+            "queries": self.queries
+        }
+
+
+name_cache = NameCache()
\ No newline at end of file
@@ -1,54 +1,773 @@
+import copy
+import errno
+import glob
+import gzip
 import json
 import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 import pytz
-from typing import Dict, List, Any
+from typing import Dict, Iterable, Iterator, List, Any, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: só a trava entre threads do processo
+    fcntl = None
+
+# Ordem das categorias de participantes usada ao remontar os eventos
+CATEGORIAS = ['TANKER', 'HEALER', 'DPS', 'RESERVA']
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    """Lê uma variável de ambiente booleana ("1", "true", "sim", ...)"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "sim", "on")
+
+
+# Marcador dos eventos gravados no formato compacto de participantes
+FORMATO_COMPACTO = 2
+
+
+def encode_participants(
+        participantes: Dict[str, List[Dict[str, Any]]]
+) -> Tuple[Dict[str, List[List[Any]]], List[str]]:
+    """Codifica participantes como [user_id, índice do nome] por categoria
+
+    Cada nome aparece uma única vez na tabela de nomes do evento.
+    """
+    nomes: List[str] = []
+    indices: Dict[str, int] = {}
+    compacto: Dict[str, List[List[Any]]] = {}
+    for categoria, lista in participantes.items():
+        compacto[categoria] = []
+        for participante in lista:
+            nome = participante.get('nome_servidor') or participante.get(
+                'nome')
+            if nome is None:
+                compacto[categoria].append([participante.get('user_id')])
+                continue
+            if nome not in indices:
+                indices[nome] = len(nomes)
+                nomes.append(nome)
+            compacto[categoria].append(
+                [participante.get('user_id'), indices[nome]])
+    return compacto, nomes
+
+
+def decode_participants(compacto: Dict[str, List[List[Any]]],
+                        nomes: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """Reconstrói os participantes no formato lido pelas views"""
+    participantes: Dict[str, List[Dict[str, Any]]] = {}
+    for categoria, lista in compacto.items():
+        participantes[categoria] = []
+        for item in lista:
+            participante = {"user_id": item[0]}
+            if len(item) > 1:
+                participante["nome"] = nomes[item[1]]
+                participante["nome_servidor"] = nomes[item[1]]
+            participantes[categoria].append(participante)
+    return participantes
+
+
+def encode_event(evento: Dict[str, Any]) -> Dict[str, Any]:
+    """Cópia rasa do evento com os participantes no formato compacto"""
+    if 'participantes' not in evento:
+        return evento
+    compacto = dict(evento)
+    compacto['participantes'], compacto['nomes'] = encode_participants(
+        evento['participantes'])
+    compacto['formato_participantes'] = FORMATO_COMPACTO
+    return compacto
+
+
+def decode_event(evento: Dict[str, Any]) -> Dict[str, Any]:
+    """Converte (no próprio dicionário) um evento compacto para o formato lógico"""
+    if evento.get('formato_participantes') == FORMATO_COMPACTO:
+        evento['participantes'] = decode_participants(
+            evento['participantes'], evento.pop('nomes', []))
+        del evento['formato_participantes']
+    migrate_event(evento)
+    return evento
+
+
+# Operações de um voto: um participante entra, sai ou troca de categoria
+OPERACOES_PARTICIPANTE = ("entrar", "sair", "trocar")
+
+
+def apply_participant_delta(evento: Dict[str, Any],
+                            delta: Dict[str, Any]) -> bool:
+    """Aplica (no próprio evento) a entrada, saída ou troca de um participante
+
+    delta: {"op", "user_id", "categoria"} e, conforme a operação, "de"
+    (categoria de origem da troca) e "nome" (nome salvo ao entrar).
+    Retorna False, sem alterar nada, se o usuário não estava na categoria
+    de origem da saída ou da troca (o estado de quem gerou o delta divergiu
+    do salvo, ou a troca já está no snapshot).
+    """
+    participantes = evento.get('participantes') or {}
+    origem = delta['de'] if delta['op'] == "trocar" else delta['categoria']
+    if delta['op'] == "sair":
+        lista = participantes.get(origem, [])
+        restantes = [
+            item for item in lista if item.get('user_id') != delta['user_id']
+        ]
+        if len(restantes) == len(lista):
+            return False
+        participantes[origem] = restantes
+        return True
+
+    if delta['op'] == "trocar" and not any(
+            item.get('user_id') == delta['user_id']
+            for item in participantes.get(origem, [])):
+        return False
+
+    participantes = evento.setdefault('participantes', {})
+    for tipo in CATEGORIAS:
+        participantes.setdefault(tipo, [])
+
+    # Entrar/trocar tiram o usuário de todas as categorias antes de inserir:
+    # reaplicar o journal sobre um snapshot que já tem o voto não duplica
+    participante = None
+    for tipo, lista in participantes.items():
+        for i, item in enumerate(lista):
+            if item.get('user_id') == delta['user_id']:
+                removido = lista.pop(i)
+                if participante is None or tipo == origem:
+                    participante = removido
+                break
+    if participante is None:
+        participante = {"user_id": delta['user_id']}
+        if delta.get('nome') is not None:
+            participante['nome'] = delta['nome']
+            participante['nome_servidor'] = delta['nome']
+    participantes.setdefault(delta['categoria'], []).append(participante)
+    return True
+
+
+def update_stamp() -> Dict[str, Any]:
+    """Campos de última atualização de um evento (agora, em Brasília)"""
+    now_brasilia = datetime.now(pytz.timezone('America/Sao_Paulo'))
+    return {
+        "ultima_atualizacao":
+        now_brasilia.isoformat(),
+        "ultima_atualizacao_brasilia":
+        now_brasilia.strftime("%d/%m/%Y às %H:%M:%S (Brasília)"),
+        "atualizado_em":
+        int(now_brasilia.timestamp())
+    }
+
+
+# Versão do esquema dos eventos. Versão 2: datas normalizadas em epoch
+# (criado_em, atualizado_em) e textos de exibição pré-calculados
+# (data_curta, data_completa), para que as views não precisem parsear datas
+EVENT_SCHEMA_VERSION = 2
+
+
+def _parse_iso(valor: Any) -> datetime | None:
+    """Converte uma data ISO (sem fuso = horário de Brasília) em datetime com fuso"""
+    if not valor:
+        return None
+    try:
+        dt = datetime.fromisoformat(valor.replace('Z', '+00:00'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+    if dt.tzinfo is None:
+        dt = pytz.timezone('America/Sao_Paulo').localize(dt)
+    return dt
+
+
+def event_datetime(evento: Dict[str, Any]) -> datetime | None:
+    """Data de criação do evento com fuso"""
+    if evento.get('criado_em') is not None:
+        return datetime.fromtimestamp(evento['criado_em'], pytz.utc)
+    return _parse_iso(evento.get('data_criacao') or evento.get('timestamp'))
+
+
+def event_display_dates(criado_em: int | None,
+                        tem_data: bool = True) -> Dict[str, str]:
+    """Textos de exibição da data de criação (horário de Brasília)"""
+    if criado_em is None:
+        texto = "Data inválida" if tem_data else "Sem data"
+        return {"data_curta": texto, "data_completa": texto}
+    dt = datetime.fromtimestamp(criado_em,
+                                pytz.timezone('America/Sao_Paulo'))
+    return {
+        "data_curta": dt.strftime("%d/%m %H:%M"),
+        "data_completa": dt.strftime("%d/%m/%Y às %H:%M (Brasília)")
+    }
+
+
+def migrate_event(evento: Dict[str, Any]) -> bool:
+    """Atualiza (no próprio dicionário) um evento para o esquema atual
+
+    Retorna True se o evento precisou ser migrado.
+    """
+    if evento.get('schema', 1) >= EVENT_SCHEMA_VERSION:
+        return False
+    dt = _parse_iso(evento.get('data_criacao') or evento.get('timestamp'))
+    evento['criado_em'] = int(dt.timestamp()) if dt else None
+    atualizado = _parse_iso(evento.get('ultima_atualizacao'))
+    evento['atualizado_em'] = int(
+        atualizado.timestamp()) if atualizado else None
+    evento.update(
+        event_display_dates(
+            evento['criado_em'],
+            bool(evento.get('data_criacao') or evento.get('timestamp'))))
+    evento['schema'] = EVENT_SCHEMA_VERSION
+    return True
+
+
+# Travas consultivas entre processos (desative com STORAGE_FILE_LOCKS=0)
+FILE_LOCKS_ENABLED = _env_flag("STORAGE_FILE_LOCKS", True)
+FILE_LOCK_TIMEOUT = float(os.getenv("STORAGE_FILE_LOCK_TIMEOUT", 10))
+
+
+class InterProcessLock:
+    """Trava de leitores/escritor entre processos sobre <arquivo>.lock
+
+    Vários processos podem ler ao mesmo tempo (flock compartilhado); quem
+    grava tem acesso exclusivo. A aquisição é tentada sem bloquear, com
+    backoff exponencial até FILE_LOCK_TIMEOUT. Dentro do processo as
+    threads são serializadas por um RLock, e aquisições aninhadas reutilizam
+    a trava já obtida.
+    """
+
+    def __init__(self, filename: str):
+        self.path = filename + ".lock"
+        self._thread_lock = threading.RLock()
+        self._fd: int | None = None
+        self._pid = os.getpid()
+        self._depth = 0
+        self._exclusive = False
+        self.tentativas = 0
+        self.esperas = 0
+
+    @contextmanager
+    def acquire(self, exclusive: bool):
+        with self._thread_lock:
+            promovida = False
+            if self._depth == 0:
+                self._flock(exclusive)
+                self._exclusive = exclusive
+            elif exclusive and not self._exclusive:
+                # Leitura virando escrita: soltar e pedir a exclusiva (dois
+                # leitores promovendo ao mesmo tempo nunca se destravariam)
+                self._unlock()
+                self._flock(True)
+                self._exclusive = promovida = True
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if promovida:
+                    self._flock(False)
+                    self._exclusive = False
+                if self._depth == 0:
+                    self._unlock()
+
+    def _flock(self, exclusive: bool):
+        if fcntl is None or not FILE_LOCKS_ENABLED:
+            return
+        if self._fd is None or self._pid != os.getpid():
+            # flock vale por descrição de arquivo aberta: um processo filho
+            # (fork) precisa abrir a sua, ou dividiria a trava com o pai
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+        modo = (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB
+        espera = 0.002
+        limite = time.monotonic() + FILE_LOCK_TIMEOUT
+        while True:
+            self.tentativas += 1
+            try:
+                fcntl.flock(self._fd, modo)
+                return
+            except OSError as e:
+                if e.errno not in (errno.EAGAIN, errno.EACCES):
+                    raise
+            if time.monotonic() >= limite:
+                raise TimeoutError(
+                    f"Tempo esgotado aguardando a trava de {self.path}")
+            self.esperas += 1
+            time.sleep(espera + random.uniform(0, espera))
+            espera = min(espera * 2, 0.1)
+
+    def _unlock(self):
+        if self._fd is not None and fcntl is not None \
+                and self._pid == os.getpid():
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+
+_file_locks: Dict[str, InterProcessLock] = {}
+_file_locks_guard = threading.Lock()
+
+
+def get_file_lock(filename: str) -> InterProcessLock:
+    """Trava compartilhada por todas as instâncias que usam o arquivo"""
+    key = os.path.abspath(filename)
+    with _file_locks_guard:
+        if key not in _file_locks:
+            _file_locks[key] = InterProcessLock(key)
+        return _file_locks[key]
+
+
+def atomic_write_bytes(filename: str, chunks: Iterable[bytes]):
+    """Grava de forma atômica: arquivo temporário + fsync + rename"""
+    pasta = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(filename) + ".",
+                                    suffix=".tmp",
+                                    dir=pasta)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filename)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_json(filename: str, data: Any, **dump_kwargs):
+    """Grava JSON de forma atômica: arquivo temporário + fsync + rename"""
+    atomic_write_bytes(filename, [
+        json.dumps(data, ensure_ascii=False, **dump_kwargs).encode('utf-8')
+    ])
+
+
+# Layout do arquivo de eventos: uma linha de cabeçalho, um evento por linha
+# e um rodapé com a posição (em bytes) dos eventos mais recentes, para que
+# get_recent_events leia só o fim do arquivo
+CABECALHO_EVENTOS = {"formato": "eventos-jsonl", "versao": 1}
+RODAPE_RECENTES = 64
+
+
+def discard_incomplete_line(f) -> bool:
+    """Corta do journal aberto em "a+b" a última linha sem quebra de linha
+
+    Uma gravação interrompida deixa a linha final incompleta e a próxima
+    entrada não pode ser anexada a ela. Só com a trava exclusiva: quem lê
+    apenas ignora essa linha (ver _replay_journal).
+    """
+    tamanho = f.seek(0, os.SEEK_END)
+    if not tamanho:
+        return False
+    f.seek(tamanho - 1)
+    if f.read(1) == b"\n":
+        return False
+    f.seek(0)
+    f.truncate(f.read().rfind(b"\n") + 1)
+    return True
+
+
+def _json_line(valor: Any) -> bytes:
+    return (json.dumps(valor, ensure_ascii=False, separators=(',', ':')) +
+            "\n").encode('utf-8')
+
+
+def events_file_chunks(eventos: List[Dict[str, Any]]) -> Iterator[bytes]:
+    """Serializa os eventos no layout de linhas com rodapé de índice"""
+    cabecalho = _json_line(CABECALHO_EVENTOS)
+    yield cabecalho
+    posicao = len(cabecalho)
+    posicoes = []
+    for evento in eventos:
+        linha = _json_line(encode_event(evento))
+        posicoes.append(posicao)
+        posicao += len(linha)
+        yield linha
+    yield _json_line({
+        "rodape": True,
+        "total": len(eventos),
+        "fim_registros": posicao,
+        "recentes": posicoes[-RODAPE_RECENTES:]
+    })
+
+
+def _is_events_jsonl(primeira_linha: bytes) -> bool:
+    try:
+        cabecalho = json.loads(primeira_linha)
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        return False
+    return isinstance(cabecalho, dict) and cabecalho.get(
+        "formato") == CABECALHO_EVENTOS["formato"]
+
+
+def read_events_file(filename: str) -> List[Dict[str, Any]]:
+    """Lê todos os eventos do arquivo (layout em linhas ou JSON antigo)"""
+    with open(filename, 'rb') as f:
+        if not _is_events_jsonl(f.readline()):
+            f.seek(0)
+            eventos = json.loads(f.read().decode('utf-8')).get("eventos", [])
+        else:
+            eventos = []
+            for linha in f:
+                registro = json.loads(linha)
+                if registro.get("rodape"):
+                    break
+                eventos.append(registro)
+    return [decode_event(evento) for evento in eventos]
+
+
+def read_recent_events(filename: str,
+                       limit: int) -> List[Dict[str, Any]] | None:
+    """Lê só os N últimos eventos usando o rodapé (mais recentes primeiro)
+
+    Retorna None quando o arquivo não permite a leitura pelo fim (formato
+    antigo ou N maior que o índice do rodapé).
+    """
+    if limit <= 0:
+        return None
+    with open(filename, 'rb') as f:
+        if not _is_events_jsonl(f.readline()):
+            return None
+        tamanho = f.seek(0, os.SEEK_END)
+        bloco = min(tamanho, 16384)
+        f.seek(tamanho - bloco)
+        ultima_linha = f.read(bloco).rstrip(b"\n").rsplit(b"\n", 1)[-1]
+        try:
+            rodape = json.loads(ultima_linha)
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            return None
+        if not isinstance(rodape, dict) or not rodape.get("rodape"):
+            return None
+        recentes = rodape["recentes"]
+        if limit > len(recentes) and rodape["total"] > len(recentes):
+            return None
+        if not recentes:
+            return []
+        inicio = recentes[-min(limit, len(recentes))]
+        f.seek(inicio)
+        dados = f.read(rodape["fim_registros"] - inicio)
+    eventos = [decode_event(json.loads(linha)) for linha in dados.splitlines()]
+    return eventos[::-1]
 
 
 class EventStorage:
 
-    def __init__(self, filename: str = "eventos.json"):
+    # Cópia residente dos eventos, compartilhada entre instâncias:
+    # {filename: {"stat": (...), "data": {...}}}
+    _cache: Dict[str, Dict[str, Any]] = {}
+    cache_hits = 0
+    cache_misses = 0
+
+    def __init__(self,
+                 filename: str = "eventos.json",
+                 journal: bool | None = None,
+                 journal_max_bytes: int | None = None,
+                 journal_max_age: float | None = None):
         self.filename = filename
-        self.ensure_file_exists()
+        # Modo journal: cada atualização de participantes vira uma linha
+        # anexada ao journal, consolidada depois no arquivo principal
+        self.journal = _env_flag("EVENT_STORAGE_JOURNAL") \
+            if journal is None else journal
+        self.journal_filename = os.path.splitext(filename)[0] + ".journal"
+        self.journal_max_bytes = journal_max_bytes or int(
+            os.getenv("EVENT_JOURNAL_MAX_BYTES", 256 * 1024))
+        self.journal_max_age = journal_max_age or float(
+            os.getenv("EVENT_JOURNAL_MAX_AGE", 300))
+        self._journal_started: float | None = None
+        # Arquivo frio: eventos finalizados saem do arquivo principal para
+        # arquivos mensais compactados (gzip JSONL), só com append
+        self.archive_dir = os.getenv(
+            "EVENT_ARCHIVE_DIR",
+            os.path.join(os.path.dirname(filename), "arquivo_eventos"))
+        self.hot_limit = int(os.getenv("EVENT_HOT_LIMIT", 50))
+        self.hot_keep = int(os.getenv("EVENT_HOT_KEEP", 25))
+        self.archive_after_days = float(
+            os.getenv("EVENT_ARCHIVE_AFTER_DAYS", 7))
+        # Group commit: dentro de batch() as gravações ficam pendentes
+        self._batch_depth = 0
+        self._pending_snapshot = False
+        self._pending_journal: List[str] = []
+        self._file_lock = get_file_lock(filename)
+        with self._exclusive():
+            self.ensure_file_exists()
+
+    def _shared(self):
+        """Trava de leitura (entre threads e processos)"""
+        return self._file_lock.acquire(exclusive=False)
+
+    def _exclusive(self):
+        """Trava de escrita (entre threads e processos)"""
+        return self._file_lock.acquire(exclusive=True)
 
     def ensure_file_exists(self):
         """Garante que o arquivo JSON existe"""
         if not os.path.exists(self.filename):
-            with open(self.filename, 'w', encoding='utf-8') as f:
-                json.dump({"eventos": []}, f, ensure_ascii=False, indent=2)
+            atomic_write_bytes(self.filename, events_file_chunks([]))
+
+    def _file_stat(self) -> Tuple:
+        """Retorna (inode, mtime_ns, tamanho) dos arquivos para validar o cache"""
+        st = os.stat(self.filename)
+        stat = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if self.journal and os.path.exists(self.journal_filename):
+            jst = os.stat(self.journal_filename)
+            stat += (jst.st_ino, jst.st_mtime_ns, jst.st_size)
+        return stat
+
+    def _load(self) -> Dict[str, Any]:
+        """Retorna os dados do cache, relendo o arquivo só se ele mudou no disco"""
+        with self._shared():
+            stat = self._file_stat()
+            entry = EventStorage._cache.get(self.filename)
+            if entry is not None and entry["stat"] == stat:
+                EventStorage.cache_hits += 1
+                return entry["data"]
+
+            EventStorage.cache_misses += 1
+            data = {"eventos": read_events_file(self.filename)}
+            if self.journal:
+                self._replay_journal(data)
+            EventStorage._cache[self.filename] = {"stat": stat, "data": data}
+            return data
+
+    def _write(self, data: Dict[str, Any]):
+        """Grava os dados no arquivo e atualiza o cache (write-through)"""
+        with self._exclusive():
+            if self._batch_depth:
+                # Gravação adiada para o fim do lote
+                self._pending_snapshot = True
+                self._pending_journal.clear()
+                EventStorage._cache[self.filename]["data"] = data
+                return
+            try:
+                atomic_write_bytes(self.filename,
+                                   events_file_chunks(data["eventos"]))
+                # O snapshot já contém tudo que estava no journal
+                if self.journal and os.path.exists(self.journal_filename):
+                    open(self.journal_filename, 'w').close()
+                    self._journal_started = None
+            except Exception:
+                # Estado em memória pode ter divergido do disco
+                EventStorage._cache.pop(self.filename, None)
+                raise
+            EventStorage._cache[self.filename] = {
+                "stat": self._file_stat(),
+                "data": data
+            }
+
+    def _replay_journal(self, data: Dict[str, Any]):
+        """Aplica sobre o snapshot as entradas pendentes do journal"""
+        if not os.path.exists(self.journal_filename):
+            return
+        aplicadas = 0
+        valido_ate = 0
+        with open(self.journal_filename, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entrada = self._decode_journal_entry(
+                        json.loads(line.decode('utf-8')))
+                except (UnicodeDecodeError, json.JSONDecodeError):
+                    break
+                self._apply_journal_entry(data, entrada)
+                aplicadas += 1
+                valido_ate += len(line)
+            incompleto = f.tell() != valido_ate
+        if incompleto:
+            # Gravação interrompida: só ignorar aqui (quem lê pode ter apenas
+            # a trava compartilhada); o próximo append descarta a linha
+            print("Entrada incompleta no journal de eventos ignorada")
+        if aplicadas and self._journal_started is None:
+            self._journal_started = time.monotonic()
+
+    @staticmethod
+    def _encode_journal_entry(entrada: Dict[str, Any]) -> str:
+        """Serializa uma entrada do journal em uma linha compacta"""
+        if "participantes" in entrada:
+            entrada = dict(entrada)
+            entrada["participantes"], entrada["nomes"] = encode_participants(
+                entrada["participantes"])
+        return json.dumps(entrada, ensure_ascii=False,
+                          separators=(',', ':')) + "\n"
+
+    @staticmethod
+    def _decode_journal_entry(entrada: Dict[str, Any]) -> Dict[str, Any]:
+        """Converte uma entrada lida do journal para o formato lógico"""
+        if "nomes" in entrada:
+            entrada["participantes"] = decode_participants(
+                entrada["participantes"], entrada.pop("nomes"))
+        return entrada
+
+    @staticmethod
+    def _apply_journal_entry(data: Dict[str, Any],
+                             entrada: Dict[str, Any]) -> bool:
+        """Aplica uma entrada do journal aos dados em memória
+
+        Retorna False, sem alterar nada, se o evento não existe ou o voto
+        foi recusado (ver apply_participant_delta).
+        """
+        op = entrada.get("op")
+        if op != "participantes" and op not in OPERACOES_PARTICIPANTE:
+            return False
+        for evento in data.get("eventos", []):
+            if evento.get("event_id") == entrada.get("event_id"):
+                if op == "participantes":
+                    evento["participantes"] = entrada["participantes"]
+                elif not apply_participant_delta(evento, entrada):
+                    return False
+                evento["ultima_atualizacao"] = entrada["ultima_atualizacao"]
+                evento["ultima_atualizacao_brasilia"] = entrada[
+                    "ultima_atualizacao_brasilia"]
+                atualizado_em = entrada.get("atualizado_em")
+                if atualizado_em is None:
+                    atualizado = _parse_iso(entrada["ultima_atualizacao"])
+                    atualizado_em = int(
+                        atualizado.timestamp()) if atualizado else None
+                evento["atualizado_em"] = atualizado_em
+                return True
+        return False
+
+    def _append_journal(self, entrada: Dict[str, Any]) -> bool:
+        """Anexa uma entrada compacta ao journal e atualiza o cache
+
+        Retorna o resultado de _apply_journal_entry nos dados em cache; a
+        entrada recusada não é gravada.
+        """
+        with self._exclusive():
+            data = self._load()
+            if not self._apply_journal_entry(data, entrada):
+                return False
+            linha = self._encode_journal_entry(entrada)
+            if self._batch_depth:
+                # Snapshot pendente já vai conter esta alteração
+                if not self._pending_snapshot:
+                    self._pending_journal.append(linha)
+                return True
+            self._write_journal_lines([linha])
+            return True
+
+    def _write_journal_lines(self, linhas: List[str]):
+        """Anexa linhas ao journal com um único fsync"""
+        with self._exclusive():
+            data = EventStorage._cache[self.filename]["data"]
+            try:
+                with open(self.journal_filename, 'a+b') as f:
+                    if discard_incomplete_line(f):
+                        print("Entrada incompleta no journal de eventos "
+                              "descartada")
+                    f.write("".join(linhas).encode('utf-8'))
+                    f.flush()
+                    os.fsync(f.fileno())
+            except Exception:
+                EventStorage._cache.pop(self.filename, None)
+                raise
+            if self._journal_started is None:
+                self._journal_started = time.monotonic()
+            EventStorage._cache[self.filename] = {
+                "stat": self._file_stat(),
+                "data": data
+            }
+
+    @contextmanager
+    def batch(self):
+        """Agrupa várias operações em uma única gravação no disco
+
+        As alterações são aplicadas em memória e gravadas de uma vez ao sair
+        do bloco (snapshot atômico ou um único append no journal).
+        """
+        with self._exclusive():
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if not self._batch_depth:
+                    self._flush_pending()
+
+    def _flush_pending(self):
+        """Grava o que ficou pendente no lote"""
+        pending_snapshot = self._pending_snapshot
+        linhas = self._pending_journal
+        self._pending_snapshot = False
+        self._pending_journal = []
+        if pending_snapshot:
+            self._write(EventStorage._cache[self.filename]["data"])
+        elif linhas:
+            self._write_journal_lines(linhas)
+
+    def journal_needs_compaction(self) -> bool:
+        """Indica se o journal passou do limite de tamanho ou idade"""
+        if not self.journal or not os.path.exists(self.journal_filename):
+            return False
+        tamanho = os.path.getsize(self.journal_filename)
+        if tamanho == 0:
+            return False
+        if tamanho >= self.journal_max_bytes:
+            return True
+        return (self._journal_started is not None
+                and time.monotonic() - self._journal_started
+                >= self.journal_max_age)
+
+    def compact_journal(self, force: bool = False) -> bool:
+        """Consolida o journal no arquivo principal quando necessário"""
+        if not self.journal:
+            return False
+        try:
+            with self._exclusive():
+                data = self._load()
+                if not force and not self.journal_needs_compaction():
+                    return False
+                self._write(data)
+                print("Journal de eventos consolidado em " + self.filename)
+                return True
+        except Exception as e:
+            print(f"Erro ao consolidar journal de eventos: {e}")
+            return False
+
+    def invalidate_cache(self):
+        """Descarta a cópia em memória, forçando nova leitura do disco"""
+        EventStorage._cache.pop(self.filename, None)
+
+    @classmethod
+    def get_cache_stats(cls) -> Dict[str, int]:
+        """Retorna os contadores de acerto/falha do cache"""
+        return {"hits": cls.cache_hits, "misses": cls.cache_misses}
 
     def save_event(self, event_data: Dict[str, Any]) -> bool:
         """Salva um evento no arquivo JSON"""
         try:
-            # Ler dados existentes
-            with open(self.filename, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            with self._exclusive():
+                # Ler dados existentes
+                data = self._load()
 
-            # Adicionar timestamp se não existir
-            if 'timestamp' not in event_data:
-                brasilia_tz = pytz.timezone('America/Sao_Paulo')
-                now_brasilia = datetime.now(brasilia_tz)
-                event_data['timestamp'] = now_brasilia.isoformat()
-                event_data['data_brasilia'] = now_brasilia.strftime(
-                    "%d/%m/%Y às %H:%M:%S (Brasília)")
+                # Adicionar timestamp se não existir
+                if 'timestamp' not in event_data:
+                    brasilia_tz = pytz.timezone('America/Sao_Paulo')
+                    now_brasilia = datetime.now(brasilia_tz)
+                    event_data['timestamp'] = now_brasilia.isoformat()
+                    event_data['data_brasilia'] = now_brasilia.strftime(
+                        "%d/%m/%Y às %H:%M:%S (Brasília)")
+                migrate_event(event_data)
 
-            # Adicionar o novo evento
-            data["eventos"].append(event_data)
+                # Adicionar o novo evento
+                data["eventos"].append(copy.deepcopy(event_data))
 
-            # Verificar se chegou a 50 eventos e fazer limpeza
-            if len(data["eventos"]) >= 50:
-                print(
-                    f"Limite de 50 eventos atingido. Limpando eventos antigos..."
-                )
-                # Manter apenas os 25 mais recentes
-                data["eventos"] = data["eventos"][-25:]
-                print(
-                    f"Limpeza concluída. Mantidos {len(data['eventos'])} eventos mais recentes."
-                )
+                # Ao atingir o limite, mover eventos finalizados para o arquivo
+                if len(data["eventos"]) >= self.hot_limit:
+                    print(
+                        f"Limite de {self.hot_limit} eventos atingido. Arquivando eventos finalizados..."
+                    )
+                    arquivados = self._archive_finished(data, self.hot_keep)
+                    print(
+                        f"Arquivamento concluído. {arquivados} eventos arquivados, {len(data['eventos'])} mantidos."
+                    )
 
-            # Salvar de volta
-            with open(self.filename, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+                # Salvar de volta
+                self._write(data)
 
             return True
         except Exception as e:
@@ -58,12 +777,23 @@ class EventStorage:
     def get_recent_events(self, limit: int = 5) -> List[Dict[str, Any]]:
         """Retorna os eventos mais recentes"""
         try:
-            with open(self.filename, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            with self._shared():
+                entry = EventStorage._cache.get(self.filename)
+                if entry is None or entry["stat"] != self._file_stat():
+                    # Sem cópia válida em memória: ler só o fim do arquivo
+                    eventos = read_recent_events(self.filename, limit)
+                    if eventos is not None:
+                        EventStorage.cache_misses += 1
+                        if self.journal:
+                            self._replay_journal({"eventos": eventos})
+                        return eventos
+
+                data = self._load()
 
-            # Retornar os últimos eventos (mais recentes primeiro)
-            eventos = data.get("eventos", [])
-            return eventos[-limit:][::-1]  # Últimos N, invertidos
+                # Retornar os últimos eventos (mais recentes primeiro)
+                eventos = data.get("eventos", [])
+                return copy.deepcopy(
+                    eventos[-limit:][::-1])  # Últimos N, invertidos
         except Exception as e:
             print(f"Erro ao carregar eventos: {e}")
             return []
@@ -72,39 +802,68 @@ class EventStorage:
                                   participants_data: Dict[str, Any]) -> bool:
         """Atualiza os participantes de um evento específico"""
         try:
-            with open(self.filename, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            entrada = {
+                "op": "participantes",
+                "event_id": event_id,
+                "participantes": copy.deepcopy(participants_data),
+                **update_stamp()
+            }
 
-            # Encontrar e atualizar o evento
-            for evento in data["eventos"]:
-                if evento.get("event_id") == event_id:
-                    evento["participantes"] = participants_data
-                    brasilia_tz = pytz.timezone('America/Sao_Paulo')
-                    now_brasilia = datetime.now(brasilia_tz)
-                    evento["ultima_atualizacao"] = now_brasilia.isoformat()
-                    evento[
-                        "ultima_atualizacao_brasilia"] = now_brasilia.strftime(
-                            "%d/%m/%Y às %H:%M:%S (Brasília)")
-                    break
+            if self.journal:
+                # Custo O(1): só a alteração é anexada ao journal
+                self._append_journal(entrada)
+                return True
+
+            with self._exclusive():
+                data = self._load()
+
+                # Encontrar e atualizar o evento
+                self._apply_journal_entry(data, entrada)
 
-            # Salvar de volta
-            with open(self.filename, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+                # Salvar de volta
+                self._write(data)
 
             return True
         except Exception as e:
             print(f"Erro ao atualizar participantes: {e}")
             return False
 
+    def apply_participant_delta(self, event_id: str,
+                                delta: Dict[str, Any]) -> bool:
+        """Registra um voto (entrar/sair/trocar) sem regravar a lista inteira
+
+        Só com journal o custo independe do tamanho do arquivo: sem ele o
+        delta é aplicado em memória, mas eventos.json é regravado inteiro.
+        Retorna False se o evento não existe ou se o usuário não estava na
+        categoria de origem da saída/troca.
+        """
+        try:
+            entrada = {**delta, "event_id": event_id, **update_stamp()}
+
+            if self.journal:
+                # Uma linha pequena por voto, qualquer que seja o evento
+                return self._append_journal(entrada)
+
+            with self._exclusive():
+                data = self._load()
+                if not self._apply_journal_entry(data, entrada):
+                    return False
+                self._write(data)
+
+            return True
+        except Exception as e:
+            print(f"Erro ao registrar voto: {e}")
+            return False
+
     def get_event_by_id(self, event_id: str) -> Dict[str, Any] | None:
         """Busca um evento específico pelo ID"""
         try:
-            with open(self.filename, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            with self._shared():
+                data = self._load()
 
-            for evento in data.get("eventos", []):
-                if evento.get("event_id") == event_id:
-                    return evento
+                for evento in data.get("eventos", []):
+                    if evento.get("event_id") == event_id:
+                        return copy.deepcopy(evento)
 
             return None
         except Exception as e:
@@ -112,50 +871,169 @@ class EventStorage:
             return None
 
     def cleanup_old_events(self, keep_count: int = 25) -> bool:
-        """Remove eventos antigos mantendo apenas os mais recentes"""
+        """Arquiva eventos antigos mantendo apenas os mais recentes"""
         try:
-            with open(self.filename, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            with self._exclusive():
+                data = self._load()
 
-            eventos_antes = len(data.get("eventos", []))
+                eventos_antes = len(data.get("eventos", []))
 
-            if eventos_antes > keep_count:
-                data["eventos"] = data["eventos"][-keep_count:]
+                if eventos_antes > keep_count:
+                    arquivados = self._archive_events(
+                        data["eventos"][:-keep_count])
+                    data["eventos"] = data["eventos"][-keep_count:]
 
-                with open(self.filename, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, ensure_ascii=False, indent=2)
+                    self._write(data)
 
-                eventos_removidos = eventos_antes - len(data["eventos"])
-                print(
-                    f"Limpeza manual: {eventos_removidos} eventos antigos removidos. Mantidos: {len(data['eventos'])}"
-                )
-                return True
-            else:
-                print(
-                    f"Nenhuma limpeza necessária. Total de eventos: {eventos_antes}"
-                )
-                return True
+                    print(
+                        f"Limpeza manual: {arquivados} eventos antigos arquivados. Mantidos: {len(data['eventos'])}"
+                    )
+                    return True
+                else:
+                    print(
+                        f"Nenhuma limpeza necessária. Total de eventos: {eventos_antes}"
+                    )
+                    return True
 
         except Exception as e:
             print(f"Erro ao limpar eventos antigos: {e}")
             return False
 
+    def _is_finished(self, evento: Dict[str, Any], agora: datetime) -> bool:
+        """Evento finalizado: criado há mais que o prazo de arquivo
+
+        Enquetes nunca são encerradas (o campo "ativa" não volta a False),
+        então vale só a idade.
+        """
+        dt = event_datetime(evento)
+        if dt is None:
+            return True
+        return (agora - dt).total_seconds() > self.archive_after_days * 86400
+
+    def _archive_finished(self, data: Dict[str, Any], keep_count: int) -> int:
+        """Move para o arquivo os eventos finalizados fora dos N mais recentes"""
+        eventos = data["eventos"]
+        antigos = eventos[:-keep_count] if keep_count else eventos
+        agora = datetime.now(pytz.utc)
+        para_arquivar = [e for e in antigos if self._is_finished(e, agora)]
+        if not para_arquivar:
+            return 0
+        arquivados = self._archive_events(para_arquivar)
+        ids = {id(e) for e in para_arquivar}
+        data["eventos"] = [e for e in eventos if id(e) not in ids]
+        return arquivados
+
+    def _archive_path(self, evento: Dict[str, Any]) -> str:
+        """Arquivo mensal (pela data de criação) onde o evento é guardado"""
+        dt = event_datetime(evento) or datetime.now(pytz.utc)
+        dt = dt.astimezone(pytz.timezone('America/Sao_Paulo'))
+        return os.path.join(self.archive_dir,
+                            f"eventos-{dt.strftime('%Y-%m')}.jsonl.gz")
+
+    @staticmethod
+    def _archived_ids(caminho: str) -> set:
+        """event_ids já presentes em um arquivo mensal"""
+        ids = set()
+        if not os.path.exists(caminho):
+            return ids
+        try:
+            with gzip.open(caminho, 'rt', encoding='utf-8') as f:
+                for linha in f:
+                    ids.add(json.loads(linha).get('event_id'))
+        except (OSError, EOFError, json.JSONDecodeError) as e:
+            print(f"Erro ao ler arquivo de eventos {caminho}: {e}")
+        return ids
+
+    def _archive_events(self, eventos: List[Dict[str, Any]]) -> int:
+        """Anexa eventos aos arquivos mensais (antes de tirá-los do principal)
+
+        Quem já está no arquivo é pulado: se o processo caiu depois do append
+        e antes de regravar o principal, o próximo arquivamento não duplica.
+        """
+        por_arquivo: Dict[str, List[Dict[str, Any]]] = {}
+        for evento in eventos:
+            por_arquivo.setdefault(self._archive_path(evento),
+                                   []).append(evento)
+        os.makedirs(self.archive_dir, exist_ok=True)
+        for caminho, do_arquivo in por_arquivo.items():
+            arquivados = self._archived_ids(caminho)
+            linhas = [
+                json.dumps(encode_event(evento),
+                           ensure_ascii=False,
+                           separators=(',', ':')) + "\n"
+                for evento in do_arquivo
+                if evento.get('event_id') not in arquivados
+            ]
+            if not linhas:
+                continue
+            # Cada append vira um novo membro gzip; a leitura é contínua
+            with open(caminho, 'ab') as raw:
+                with gzip.GzipFile(fileobj=raw, mode='ab') as f:
+                    f.write("".join(linhas).encode('utf-8'))
+                raw.flush()
+                os.fsync(raw.fileno())
+        return len(eventos)
+
+    def iter_archived_events(self,
+                             inicio: datetime | None = None,
+                             fim: datetime | None = None,
+                             event_id: str | None = None
+                             ) -> Iterator[Dict[str, Any]]:
+        """Percorre os eventos arquivados sem carregar os arquivos inteiros
+
+        Filtra por intervalo de data de criação (datas com fuso) e/ou por
+        event_id. Os arquivos mensais fora do intervalo nem são abertos.
+        """
+        brasilia_tz = pytz.timezone('America/Sao_Paulo')
+        mes_inicio = inicio.astimezone(brasilia_tz).strftime(
+            '%Y-%m') if inicio else None
+        mes_fim = fim.astimezone(brasilia_tz).strftime('%Y-%m') if fim else None
+
+        caminhos = sorted(
+            glob.glob(os.path.join(self.archive_dir, "eventos-*.jsonl.gz")))
+        for caminho in caminhos:
+            mes = os.path.basename(caminho)[len("eventos-"):-len(".jsonl.gz")]
+            if (mes_inicio and mes < mes_inicio) or (mes_fim
+                                                     and mes > mes_fim):
+                continue
+            try:
+                with gzip.open(caminho, 'rt', encoding='utf-8') as f:
+                    for linha in f:
+                        if event_id and event_id not in linha:
+                            continue
+                        evento = decode_event(json.loads(linha))
+                        if event_id and evento.get('event_id') != event_id:
+                            continue
+                        if inicio or fim:
+                            dt = event_datetime(evento)
+                            if dt is None or (inicio and dt < inicio) or (
+                                    fim and dt > fim):
+                                continue
+                        yield evento
+            except (OSError, EOFError, json.JSONDecodeError) as e:
+                print(f"Erro ao ler arquivo de eventos {caminho}: {e}")
+
+    def get_archived_event(self, event_id: str) -> Dict[str, Any] | None:
+        """Busca um evento arquivado pelo ID"""
+        for evento in self.iter_archived_events(event_id=event_id):
+            return evento
+        return None
+
     def delete_events(self, event_ids: List[str]) -> bool:
         """Deleta eventos específicos pelos seus IDs"""
         try:
-            with open(self.filename, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            with self._exclusive():
+                data = self._load()
 
-            eventos_antes = len(data.get("eventos", []))
+                eventos_antes = len(data.get("eventos", []))
 
-            # Filtrar eventos que não estão na lista de IDs para deletar
-            data["eventos"] = [
-                evento for evento in data["eventos"]
-                if evento.get("event_id") not in event_ids
-            ]
+                # Filtrar eventos que não estão na lista de IDs para deletar
+                data["eventos"] = [
+                    evento for evento in data["eventos"]
+                    if evento.get("event_id") not in event_ids
+                ]
 
-            with open(self.filename, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+                self._write(data)
 
             eventos_removidos = eventos_antes - len(data["eventos"])
             print(
@@ -167,12 +1045,442 @@ class EventStorage:
             print(f"Erro ao deletar eventos: {e}")
             return False
 
+    def get_active_polls(self) -> List[Dict[str, Any]]:
+        """Enquetes abertas com mensagem publicada (só os IDs, sem participantes)"""
+        try:
+            with self._shared():
+                data = self._load()
+                return [{
+                    "event_id": evento["event_id"],
+                    "message_id": evento["message_id"],
+                    "canal_id": evento.get("canal_id")
+                } for evento in data.get("eventos", [])
+                        if evento.get("ativa") and evento.get("message_id")]
+        except Exception as e:
+            print(f"Erro ao carregar enquetes ativas: {e}")
+            return []
+
     def get_all_events(self) -> List[Dict[str, Any]]:
         """Retorna todos os eventos salvos"""
         try:
-            with open(self.filename, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            return data.get("eventos", [])
+            with self._shared():
+                data = self._load()
+                return copy.deepcopy(data.get("eventos", []))
         except Exception as e:
             print(f"Erro ao carregar todos os eventos: {e}")
-            return []
\ No newline at end of file
+            return []
+
+
+class SQLiteEventStorage:
+    """Armazenamento de eventos em SQLite com consultas indexadas"""
+
+    def __init__(self,
+                 filename: str = "eventos.db",
+                 json_filename: str = "eventos.json"):
+        self.filename = filename
+        self._lock = threading.RLock()
+        self._batch_depth = 0
+        # Transações controladas explicitamente (BEGIN IMMEDIATE), para que
+        # leitura e escrita de uma operação fiquem na mesma transação mesmo
+        # com outros processos usando o banco; timeout = espera pela trava
+        self.conn = sqlite3.connect(filename,
+                                    timeout=FILE_LOCK_TIMEOUT,
+                                    isolation_level=None,
+                                    check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.ensure_schema()
+        self.import_from_json(json_filename)
+
+    def ensure_schema(self):
+        """Cria as tabelas e índices se ainda não existirem"""
+        with self._lock:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS eventos (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    event_id TEXT NOT NULL,
+                    data_criacao TEXT,
+                    canal_id INTEGER,
+                    autor_id INTEGER,
+                    message_id INTEGER,
+                    dados TEXT NOT NULL
+                );
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_eventos_event_id
+                    ON eventos(event_id);
+                CREATE INDEX IF NOT EXISTS idx_eventos_data_criacao
+                    ON eventos(data_criacao);
+                CREATE INDEX IF NOT EXISTS idx_eventos_canal_id
+                    ON eventos(canal_id);
+                CREATE INDEX IF NOT EXISTS idx_eventos_autor_id
+                    ON eventos(autor_id);
+
+                CREATE TABLE IF NOT EXISTS participantes (
+                    event_id TEXT NOT NULL
+                        REFERENCES eventos(event_id) ON DELETE CASCADE,
+                    categoria TEXT NOT NULL,
+                    posicao INTEGER NOT NULL,
+                    user_id INTEGER,
+                    dados TEXT NOT NULL,
+                    PRIMARY KEY (event_id, categoria, posicao)
+                );
+            """)
+
+    @contextmanager
+    def _transaction(self):
+        """Transação de uma operação; dentro de batch() vira um savepoint"""
+        if not self._batch_depth:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+            return
+        self.conn.execute("SAVEPOINT operacao")
+        try:
+            yield
+        except Exception:
+            self.conn.execute("ROLLBACK TO operacao")
+            self.conn.execute("RELEASE operacao")
+            raise
+        self.conn.execute("RELEASE operacao")
+
+    @contextmanager
+    def batch(self):
+        """Agrupa várias operações em um único commit"""
+        with self._lock:
+            # Lote aninhado vira um savepoint: falhas desfazem só ele
+            if not self._batch_depth:
+                self.conn.execute("BEGIN IMMEDIATE")
+            else:
+                self.conn.execute("SAVEPOINT lote")
+            self._batch_depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._batch_depth -= 1
+                if not self._batch_depth:
+                    self.conn.execute("ROLLBACK")
+                else:
+                    self.conn.execute("ROLLBACK TO lote")
+                    self.conn.execute("RELEASE lote")
+                raise
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self.conn.execute("COMMIT")
+            else:
+                self.conn.execute("RELEASE lote")
+
+    def import_from_json(self, json_filename: str):
+        """Importa os eventos do arquivo JSON antigo quando o banco está vazio"""
+        try:
+            if not os.path.exists(json_filename):
+                return
+            with self._lock, self._transaction():
+                total = self.conn.execute(
+                    "SELECT COUNT(*) FROM eventos").fetchone()[0]
+                if total:
+                    return
+                eventos = read_events_file(json_filename)
+                for evento in eventos:
+                    self._insert_event(evento)
+            if eventos:
+                print(
+                    f"Migrados {len(eventos)} eventos de {json_filename} para {self.filename}"
+                )
+        except Exception as e:
+            print(f"Erro ao importar eventos do JSON: {e}")
+
+    def _insert_event(self, event_data: Dict[str, Any]):
+        """Insere um evento e seus participantes (dentro de uma transação)"""
+        dados = {
+            k: v
+            for k, v in event_data.items() if k != 'participantes'
+        }
+        self.conn.execute(
+            "INSERT INTO eventos (event_id, data_criacao, canal_id, autor_id, "
+            "message_id, dados) VALUES (?, ?, ?, ?, ?, ?)",
+            (event_data.get('event_id'), event_data.get('data_criacao'),
+             event_data.get('canal_id'), event_data.get('autor_id'),
+             event_data.get('message_id'),
+             json.dumps(dados, ensure_ascii=False)))
+        if 'participantes' in event_data:
+            self._insert_participants(event_data.get('event_id'),
+                                      event_data['participantes'])
+
+    def _insert_participants(self, event_id: str,
+                             participants_data: Dict[str, Any]):
+        """Grava as linhas de participantes de um evento"""
+        rows = []
+        for categoria, participantes in participants_data.items():
+            for posicao, participante in enumerate(participantes):
+                # Só o nome exibido é guardado junto do user_id
+                nome = participante.get('nome_servidor') or participante.get(
+                    'nome')
+                rows.append((event_id, categoria, posicao,
+                             participante.get('user_id'),
+                             json.dumps(nome, ensure_ascii=False)))
+        self.conn.executemany(
+            "INSERT INTO participantes (event_id, categoria, posicao, "
+            "user_id, dados) VALUES (?, ?, ?, ?, ?)", rows)
+
+    def _rows_to_events(self, rows) -> List[Dict[str, Any]]:
+        """Monta os dicionários de evento a partir das linhas do banco"""
+        eventos = [json.loads(row['dados']) for row in rows]
+        if not eventos:
+            return eventos
+
+        # Migração preguiçosa: registros antigos são atualizados uma única vez
+        migrados = [evento for evento in eventos if migrate_event(evento)]
+        if migrados:
+            with self._transaction():
+                self.conn.executemany(
+                    "UPDATE eventos SET dados = ? WHERE event_id = ?",
+                    [(json.dumps(evento, ensure_ascii=False),
+                      evento.get('event_id')) for evento in migrados])
+
+        ids = [evento.get('event_id') for evento in eventos]
+        placeholders = ",".join("?" * len(ids))
+        participantes_por_evento: Dict[str, Dict[str, List]] = {}
+        for row in self.conn.execute(
+                "SELECT event_id, categoria, user_id, dados FROM participantes "
+                f"WHERE event_id IN ({placeholders}) "
+                "ORDER BY event_id, categoria, posicao", ids):
+            categorias = participantes_por_evento.setdefault(
+                row['event_id'], {})
+            categorias.setdefault(row['categoria'], []).append(
+                self._decode_participant(row['user_id'],
+                                         json.loads(row['dados'])))
+
+        for evento in eventos:
+            categorias = participantes_por_evento.get(evento.get('event_id'))
+            # Eventos já atualizados exibem todas as categorias, mesmo vazias
+            if categorias is None and 'ultima_atualizacao' not in evento:
+                continue
+            categorias = categorias or {}
+            participantes = {
+                tipo: categorias.pop(tipo, [])
+                for tipo in CATEGORIAS
+            }
+            participantes.update(categorias)
+            evento['participantes'] = participantes
+        return eventos
+
+    @staticmethod
+    def _decode_participant(user_id: int, dados: Any) -> Dict[str, Any]:
+        """Monta o participante a partir do nome guardado na linha"""
+        if isinstance(dados, dict):
+            # Linhas antigas guardavam o dicionário completo
+            return dados
+        participante = {"user_id": user_id}
+        if dados is not None:
+            participante["nome"] = dados
+            participante["nome_servidor"] = dados
+        return participante
+
+    def save_event(self, event_data: Dict[str, Any]) -> bool:
+        """Salva um evento no banco"""
+        try:
+            # Adicionar timestamp se não existir
+            if 'timestamp' not in event_data:
+                brasilia_tz = pytz.timezone('America/Sao_Paulo')
+                now_brasilia = datetime.now(brasilia_tz)
+                event_data['timestamp'] = now_brasilia.isoformat()
+                event_data['data_brasilia'] = now_brasilia.strftime(
+                    "%d/%m/%Y às %H:%M:%S (Brasília)")
+            migrate_event(event_data)
+
+            with self._lock, self._transaction():
+                self._insert_event(event_data)
+            return True
+        except Exception as e:
+            print(f"Erro ao salvar evento: {e}")
+            return False
+
+    def get_recent_events(self, limit: int = 5) -> List[Dict[str, Any]]:
+        """Retorna os eventos mais recentes"""
+        try:
+            with self._lock:
+                rows = self.conn.execute(
+                    "SELECT dados FROM eventos ORDER BY seq DESC LIMIT ?",
+                    (limit, )).fetchall()
+                return self._rows_to_events(rows)
+        except Exception as e:
+            print(f"Erro ao carregar eventos: {e}")
+            return []
+
+    def update_event_participants(self, event_id: str,
+                                  participants_data: Dict[str, Any]) -> bool:
+        """Atualiza os participantes de um evento específico"""
+        try:
+            with self._lock, self._transaction():
+                row = self.conn.execute(
+                    "SELECT dados FROM eventos WHERE event_id = ?",
+                    (event_id, )).fetchone()
+                if row is None:
+                    return True
+
+                self._touch_event(row, event_id)
+                self.conn.execute(
+                    "DELETE FROM participantes WHERE event_id = ?",
+                    (event_id, ))
+                self._insert_participants(event_id, participants_data)
+            return True
+        except Exception as e:
+            print(f"Erro ao atualizar participantes: {e}")
+            return False
+
+    def _touch_event(self, row, event_id: str):
+        """Grava a data de última atualização no registro do evento"""
+        dados = json.loads(row['dados'])
+        dados.update(update_stamp())
+        self.conn.execute("UPDATE eventos SET dados = ? WHERE event_id = ?",
+                          (json.dumps(dados, ensure_ascii=False), event_id))
+
+    def apply_participant_delta(self, event_id: str,
+                                delta: Dict[str, Any]) -> bool:
+        """Registra um voto (entrar/sair/trocar) alterando uma só linha
+
+        Retorna False, sem alterar nada, se o evento não existe ou se o
+        usuário não estava na categoria de origem da saída/troca.
+        """
+        try:
+            with self._lock, self._transaction():
+                row = self.conn.execute(
+                    "SELECT dados FROM eventos WHERE event_id = ?",
+                    (event_id, )).fetchone()
+                if row is None:
+                    return False
+
+                op = delta['op']
+                nome = json.dumps(delta.get('nome'), ensure_ascii=False)
+                origem = delta['de'] if op == "trocar" else delta['categoria']
+                if op == "sair":
+                    if not self.conn.execute(
+                            "DELETE FROM participantes WHERE event_id = ? "
+                            "AND categoria = ? AND user_id = ?",
+                            (event_id, origem, delta['user_id'])).rowcount:
+                        return False
+                else:
+                    # Como no JSON: o usuário sai de todas as categorias
+                    # antes de entrar, para o voto nunca ficar duplicado
+                    linhas = self.conn.execute(
+                        "SELECT categoria, dados FROM participantes "
+                        "WHERE event_id = ? AND user_id = ?",
+                        (event_id, delta['user_id'])).fetchall()
+                    if op == "trocar" and not any(
+                            l['categoria'] == origem for l in linhas):
+                        return False
+                    if linhas:
+                        # Na troca o nome salvo ao entrar acompanha o usuário
+                        nome = next((l['dados'] for l in linhas
+                                     if l['categoria'] == origem),
+                                    linhas[0]['dados'])
+                        self.conn.execute(
+                            "DELETE FROM participantes WHERE event_id = ? "
+                            "AND user_id = ?", (event_id, delta['user_id']))
+                if op != "sair":
+                    # Fim da categoria (a chave primária serve de índice)
+                    posicao = self.conn.execute(
+                        "SELECT COALESCE(MAX(posicao) + 1, 0) FROM "
+                        "participantes WHERE event_id = ? AND categoria = ?",
+                        (event_id, delta['categoria'])).fetchone()[0]
+                    self.conn.execute(
+                        "INSERT INTO participantes (event_id, categoria, "
+                        "posicao, user_id, dados) VALUES (?, ?, ?, ?, ?)",
+                        (event_id, delta['categoria'], posicao,
+                         delta['user_id'], nome))
+                self._touch_event(row, event_id)
+            return True
+        except Exception as e:
+            print(f"Erro ao registrar voto: {e}")
+            return False
+
+    def get_event_by_id(self, event_id: str) -> Dict[str, Any] | None:
+        """Busca um evento específico pelo ID"""
+        try:
+            with self._lock:
+                rows = self.conn.execute(
+                    "SELECT dados FROM eventos WHERE event_id = ?",
+                    (event_id, )).fetchall()
+                eventos = self._rows_to_events(rows)
+            return eventos[0] if eventos else None
+        except Exception as e:
+            print(f"Erro ao buscar evento: {e}")
+            return None
+
+    def cleanup_old_events(self, keep_count: int = 25) -> bool:
+        """Remove eventos antigos mantendo apenas os mais recentes"""
+        try:
+            with self._lock, self._transaction():
+                cursor = self.conn.execute(
+                    "DELETE FROM eventos WHERE seq NOT IN "
+                    "(SELECT seq FROM eventos ORDER BY seq DESC LIMIT ?)",
+                    (keep_count, ))
+            print(
+                f"Limpeza manual: {cursor.rowcount} eventos antigos removidos."
+            )
+            return True
+        except Exception as e:
+            print(f"Erro ao limpar eventos antigos: {e}")
+            return False
+
+    def delete_events(self, event_ids: List[str]) -> bool:
+        """Deleta eventos específicos pelos seus IDs"""
+        try:
+            with self._lock, self._transaction():
+                cursor = self.conn.executemany(
+                    "DELETE FROM eventos WHERE event_id = ?",
+                    [(event_id, ) for event_id in event_ids])
+            print(f"Deletados {cursor.rowcount} eventos.")
+            return True
+        except Exception as e:
+            print(f"Erro ao deletar eventos: {e}")
+            return False
+
+    def get_active_polls(self) -> List[Dict[str, Any]]:
+        """Enquetes abertas com mensagem publicada (só os IDs, sem participantes)"""
+        try:
+            with self._lock:
+                rows = self.conn.execute(
+                    "SELECT event_id, message_id, canal_id FROM eventos "
+                    "WHERE message_id IS NOT NULL "
+                    "AND json_extract(dados, '$.ativa') ORDER BY seq").fetchall()
+                return [dict(row) for row in rows]
+        except Exception as e:
+            print(f"Erro ao carregar enquetes ativas: {e}")
+            return []
+
+    def get_all_events(self) -> List[Dict[str, Any]]:
+        """Retorna todos os eventos salvos"""
+        try:
+            with self._lock:
+                rows = self.conn.execute(
+                    "SELECT dados FROM eventos ORDER BY seq").fetchall()
+                return self._rows_to_events(rows)
+        except Exception as e:
+            print(f"Erro ao carregar todos os eventos: {e}")
+            return []
+
+
+# Instâncias compartilhadas por backend (ver get_event_storage)
+_event_storages: Dict[str, Any] = {}
+
+
+def get_event_storage():
+    """Retorna o armazenamento de eventos configurado
+
+    O backend é escolhido pela variável de ambiente EVENT_STORAGE_BACKEND
+    ("json", padrão, ou "sqlite"); o caminho do banco SQLite vem de
+    EVENT_STORAGE_DB (padrão: eventos.db).
+    """
+    backend = os.getenv("EVENT_STORAGE_BACKEND", "json").strip().lower()
+    if backend not in _event_storages:
+        if backend == "sqlite":
+            _event_storages[backend] = SQLiteEventStorage(
+                os.getenv("EVENT_STORAGE_DB", "eventos.db"))
+        else:
+            _event_storages[backend] = EventStorage()
+    return _event_storages[backend]
\ No newline at end of file
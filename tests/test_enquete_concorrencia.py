@@ -0,0 +1,230 @@
+"""Votos simultâneos numa enquete: limites e armazenamento igual à memória"""
+import asyncio
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from async_storage import AsyncEventStorage
+from coag.enquete import EnqueteView, FilaVotos
+from storage import EventStorage
+
+LIMITES = {"TANKER": 2, "HEALER": 3, "DPS": 10, "RESERVA": 5}
+
+
+class Mensagem:
+
+    async def edit(self, **kwargs):
+        await asyncio.sleep(0)
+        return self
+
+
+def membro(user_id):
+    return SimpleNamespace(id=user_id, nick=f"Jogador {user_id}",
+                           global_name=None, name=f"jogador{user_id}")
+
+
+class Interacao:
+    """Clique falso: registra as respostas enviadas ao usuário"""
+
+    def __init__(self, user_id, guild):
+        self.user = SimpleNamespace(id=user_id)
+        self.guild = guild
+        self.message = Mensagem()
+        self.respostas = []  # ("send_message" | "defer" | "followup", texto)
+        self.response = SimpleNamespace(send_message=self._send_message,
+                                        defer=self._defer,
+                                        is_done=lambda: bool(self.respostas))
+        self.followup = SimpleNamespace(send=self._followup)
+
+    async def _send_message(self, texto=None, **kwargs):
+        self.respostas.append(("send_message", texto))
+
+    async def _defer(self, **kwargs):
+        self.respostas.append(("defer", None))
+
+    async def _followup(self, texto=None, **kwargs):
+        self.respostas.append(("followup", texto))
+
+
+@pytest.fixture
+def ambiente(tmp_path):
+    guild = SimpleNamespace(id=1, get_member=membro)
+    canal = SimpleNamespace(id=10, guild=guild,
+                            get_partial_message=lambda _: Mensagem())
+    bot = SimpleNamespace(get_channel=lambda _: canal,
+                          get_guild=lambda _: guild,
+                          get_user=lambda _: None)
+    storage = AsyncEventStorage(
+        EventStorage(str(tmp_path / "eventos.json"), journal=True))
+    return SimpleNamespace(bot=bot, guild=guild, canal=canal,
+                           storage=storage)
+
+
+def criar_view(ambiente, event_id, participantes=None):
+    evento = {
+        "event_id": event_id,
+        "titulo": "Enquete",
+        "horario": "20:00",
+        "levar": "Não especificado",
+        "autor_id": 0,
+        "canal_id": ambiente.canal.id,
+        "message_id": 1,
+        "limites": LIMITES,
+        "participantes": participantes or {},
+        "data_criacao": "2025-06-21T14:43:54.279602"
+    }
+    ambiente.storage.storage.save_event(evento)
+    view = EnqueteView(ambiente.bot, evento, LIMITES)
+    view.storage = ambiente.storage
+    view.carregar_participantes(participantes)
+    return view
+
+
+def conferir_limites(view, violacoes):
+    """Confere os limites das categorias a cada voto aplicado"""
+    aplicar = view.aplicar_voto
+
+    def aplicar_conferindo(user_id, tipo):
+        resultado = aplicar(user_id, tipo)
+        for categoria, votos in view.votos.items():
+            if len(votos) > view.limites[categoria]:
+                violacoes.append((categoria, list(votos)))
+        return resultado
+
+    view.aplicar_voto = aplicar_conferindo
+
+
+async def clicar_todos(ambiente, view, cliques, usuarios, seed):
+    aleatorio = random.Random(seed)
+    interacoes = []
+
+    async def clicar():
+        interacao = Interacao(aleatorio.randrange(usuarios), ambiente.guild)
+        interacoes.append(interacao)
+        await asyncio.sleep(aleatorio.uniform(0, 0.01))
+        await view.processar_voto(interacao, aleatorio.choice(list(LIMITES)))
+
+    await asyncio.gather(*(clicar() for _ in range(cliques)))
+    await esperar_gravacao(view)
+    return interacoes
+
+
+async def esperar_gravacao(view):
+    """Fila gravada, recarga (se houve voto recusado) e edição concluídas"""
+    while True:
+        await view.fila.join()
+        if view._recarga is None:
+            break
+        await view._recarga
+    await view.editor.flush()
+
+
+class RecusaUmVoto:
+    """Armazenamento que recusa o primeiro delta (sem gravá-lo)"""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.recusados = 0
+
+    def __getattr__(self, nome):
+        return getattr(self.storage, nome)
+
+    async def apply_participant_delta(self, event_id, delta):
+        if not self.recusados:
+            self.recusados += 1
+            return False
+        return await self.storage.apply_participant_delta(event_id, delta)
+
+
+def salvos(ambiente, view):
+    evento = ambiente.storage.storage.get_event_by_id(
+        view.enquete_data['event_id'])
+    return {
+        tipo: [p['user_id'] for p in evento['participantes'].get(tipo, [])]
+        for tipo in LIMITES
+    }
+
+
+def test_limites_respeitados_e_votos_gravados(ambiente):
+
+    async def main():
+        view = criar_view(ambiente, "concorrencia-limites")
+        violacoes = []
+        conferir_limites(view, violacoes)
+        interacoes = await clicar_todos(ambiente, view, cliques=500,
+                                        usuarios=60, seed=1)
+        return view, violacoes, interacoes
+
+    view, violacoes, interacoes = asyncio.run(main())
+
+    assert violacoes == []
+    assert salvos(ambiente, view) == view.votos
+    assert all(len(i.respostas) == 1 for i in interacoes)
+    for tipo, votos in view.votos.items():
+        assert len(votos) == len(set(votos))
+        assert all(view.user_votes[u] == tipo for u in votos)
+    assert sum(len(v) for v in view.votos.values()) == len(view.user_votes)
+
+
+def test_fila_cheia_responde_com_defer(ambiente):
+
+    async def main():
+        view = criar_view(ambiente, "concorrencia-fila-cheia")
+        view.fila = FilaVotos(view.gravar_votos, maxsize=5)
+        violacoes = []
+        conferir_limites(view, violacoes)
+        interacoes = await clicar_todos(ambiente, view, cliques=300,
+                                        usuarios=40, seed=2)
+        return view, violacoes, interacoes
+
+    view, violacoes, interacoes = asyncio.run(main())
+
+    assert violacoes == []
+    assert salvos(ambiente, view) == view.votos
+    adiadas = [i for i in interacoes if i.respostas[0][0] == "defer"]
+    assert adiadas
+    for interacao in interacoes:
+        tipos = [tipo for tipo, _ in interacao.respostas]
+        assert tipos in (["send_message"], ["defer", "followup"])
+
+
+def test_voto_recusado_recarrega_do_armazenamento(ambiente):
+
+    async def main():
+        view = criar_view(ambiente, "concorrencia-recusado", {
+            "DPS": [{"user_id": 5, "nome": "Jogador 5"}]
+        })
+        # Estado em memória divergente: o usuário 7 não está no salvo
+        view.votos["TANKER"].append(7)
+        view.user_votes[7] = "TANKER"
+        await view.processar_voto(Interacao(7, ambiente.guild), "TANKER")
+        await esperar_gravacao(view)
+        return view
+
+    view = asyncio.run(main())
+
+    assert view.user_votes == {5: "DPS"}
+    assert salvos(ambiente, view) == view.votos
+
+
+def test_voto_recusado_com_fila_cheia_nao_trava_a_enquete(ambiente):
+
+    async def main():
+        view = criar_view(ambiente, "concorrencia-recusado-fila-cheia")
+        view.storage = RecusaUmVoto(ambiente.storage)
+        view.fila = FilaVotos(view.gravar_votos, maxsize=3)
+        interacoes = [Interacao(user_id, ambiente.guild)
+                      for user_id in range(40)]
+        # Todos de uma vez: a fila enche e quem vota espera com a trava
+        await asyncio.wait_for(asyncio.gather(*(
+            view.processar_voto(interacao, "DPS" if i % 2 else "RESERVA")
+            for i, interacao in enumerate(interacoes))), timeout=10)
+        await asyncio.wait_for(esperar_gravacao(view), timeout=10)
+        return view, interacoes
+
+    view, interacoes = asyncio.run(main())
+
+    assert view.storage.recusados == 1
+    assert all(interacao.respostas for interacao in interacoes)
+    assert salvos(ambiente, view) == view.votos
\ No newline at end of file
@@ -1,58 +1,731 @@
+import bisect
+import csv
+import heapq
+import io
 import json
 import os
+import sqlite3
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 import pytz
-from typing import Dict, List, Any
+from typing import Dict, Iterable, Iterator, List, Any, Tuple
+
+from storage import (FILE_LOCK_TIMEOUT, atomic_write_bytes, atomic_write_json,
+                     discard_incomplete_line, get_file_lock)
+
+# Valores exibidos quando a verificação ainda não tem vocação/status
+VOCACAO_PADRAO = 'Não selecionada'
+STATUS_PADRAO = 'desconhecido'
+
+
+def empty_stats() -> Dict[str, Any]:
+    """Contadores zerados: total, vocação, status e dia da última gravação"""
+    return {
+        "total": 0,
+        "vocacao": {},
+        "status": {},
+        "atualizadas_por_dia": {}
+    }
+
+
+def stats_keys(verification: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """Contadores em que uma verificação entra: (tipo, chave)"""
+    chaves = [('vocacao', verification.get('vocacao') or VOCACAO_PADRAO),
+              ('status', verification.get('status') or STATUS_PADRAO)]
+    # Dia (horário de Brasília) da última atualização do registro: data e
+    # timestamp são regravados a cada etapa da verificação, então a data
+    # original não existe mais (daí o nome do contador)
+    dia = (verification.get('timestamp') or '')[:10]
+    if dia:
+        chaves.append(('atualizadas_por_dia', dia))
+    return chaves
+
+
+def apply_stats(stats: Dict[str, Any], verification: Dict[str, Any] | None,
+                delta: int):
+    """Soma (delta=1) ou retira (delta=-1) uma verificação dos contadores"""
+    if verification is None:
+        return
+    stats["total"] += delta
+    for tipo, chave in stats_keys(verification):
+        contagem = stats[tipo]
+        contagem[chave] = contagem.get(chave, 0) + delta
+        if not contagem[chave]:
+            del contagem[chave]
+
+
+def build_stats(verificacoes: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Recalcula os contadores do zero"""
+    stats = empty_stats()
+    for verification in verificacoes:
+        apply_stats(stats, verification, 1)
+    return stats
+
+
+def page_key(verification: Dict[str, Any]) -> Tuple[str, Any]:
+    """Chave de ordenação/cursor das páginas: (timestamp, user_id)"""
+    return (verification.get('timestamp') or '', verification.get('user_id'))
+
+
+# Colunas do CSV de importação/exportação
+CAMPOS_CSV = [
+    'user_id', 'nick_discord', 'nome_global', 'nick_atual_servidor',
+    'vocacao', 'status', 'data', 'timestamp'
+]
+
+
+def bulk_format(filename: str, formato: str | None = None) -> str:
+    """Formato do arquivo de importação/exportação ("csv" ou "jsonl")"""
+    formato = (formato or os.path.splitext(filename)[1].lstrip('.')).lower()
+    return "csv" if formato == "csv" else "jsonl"
+
+
+# Datas aceitas na importação além de ISO 8601 e epoch (horário de Brasília)
+FORMATOS_DATA_IMPORTACAO = ("%d/%m/%Y às %H:%M:%S (Brasília)",
+                            "%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%d/%m/%Y")
+
+
+def normalize_user_id(valor: Any) -> int:
+    """user_id como int (a chave do índice e das páginas); ValueError se faltar"""
+    if valor is None or valor == '' or isinstance(valor, bool):
+        raise ValueError("verificação sem user_id")
+    return int(valor)
+
+
+def normalize_timestamp(valor: Any) -> datetime:
+    """Data de uma verificação importada, no fuso de Brasília
+
+    Aceita ISO 8601, epoch em segundos ou dd/mm/aaaa (com ou sem horário);
+    ValueError se faltar ou não for reconhecida.
+    """
+    brasilia_tz = pytz.timezone('America/Sao_Paulo')
+    if valor is None or valor == '' or isinstance(valor, bool):
+        raise ValueError("verificação sem timestamp")
+    if isinstance(valor, (int, float)):
+        return datetime.fromtimestamp(valor, brasilia_tz)
+    if not isinstance(valor, str):
+        raise ValueError(f"timestamp inválido: {valor!r}")
+    texto = valor.strip()
+    if texto.replace('.', '', 1).isdigit():
+        return datetime.fromtimestamp(float(texto), brasilia_tz)
+    try:
+        dt = datetime.fromisoformat(texto)
+    except ValueError:
+        for formato in FORMATOS_DATA_IMPORTACAO:
+            try:
+                dt = datetime.strptime(texto, formato)
+                break
+            except ValueError:
+                continue
+        else:
+            raise ValueError(f"timestamp inválido: {valor!r}")
+    if dt.tzinfo is None:
+        return brasilia_tz.localize(dt)
+    return dt.astimezone(brasilia_tz)
+
+
+def iter_verification_file(filename: str,
+                           formato: str | None = None
+                           ) -> Iterator[Dict[str, Any]]:
+    """Lê verificações de um arquivo JSONL ou CSV, um registro por vez
+
+    O user_id de cada registro é normalizado para int e o timestamp para
+    ISO 8601 em Brasília (sem timestamp vale o campo data); data é refeita
+    a partir dele, como em save_verification. Um registro sem user_id ou
+    data válidos interrompe a importação (ValueError com o número do
+    registro).
+    """
+    with open(filename, 'r', encoding='utf-8', newline='') as f:
+        if bulk_format(filename, formato) == "csv":
+            registros = ({
+                campo: valor if valor != '' else None
+                for campo, valor in linha.items()
+            } for linha in csv.DictReader(f))
+        else:
+            registros = (json.loads(linha) for linha in f if linha.strip())
+        for numero, verification in enumerate(registros, 1):
+            try:
+                verification['user_id'] = normalize_user_id(
+                    verification.get('user_id'))
+                dt = normalize_timestamp(
+                    verification.get('timestamp') or verification.get('data'))
+            except (TypeError, ValueError) as e:
+                raise ValueError(
+                    f"{filename}: registro {numero} inválido: {e}") from e
+            verification['timestamp'] = dt.isoformat()
+            verification['data'] = dt.strftime(
+                "%d/%m/%Y às %H:%M:%S (Brasília)")
+            yield verification
+
+
+def verification_file_chunks(verificacoes: Iterable[Dict[str, Any]],
+                             formato: str,
+                             por_bloco: int = 1000) -> Iterator[bytes]:
+    """Serializa verificações em JSONL ou CSV, em blocos de registros"""
+    buffer = io.StringIO()
+    writer = None
+    if formato == "csv":
+        writer = csv.DictWriter(buffer,
+                                fieldnames=CAMPOS_CSV,
+                                extrasaction='ignore')
+        writer.writeheader()
+    for i, verification in enumerate(verificacoes, 1):
+        if writer is not None:
+            writer.writerow(verification)
+        else:
+            buffer.write(
+                json.dumps(verification,
+                           ensure_ascii=False,
+                           separators=(',', ':')) + "\n")
+        if i % por_bloco == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def copy_stats(stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Cópia dos contadores para entregar a quem chamou"""
+    return {
+        "total": stats["total"],
+        "vocacao": dict(stats["vocacao"]),
+        "status": dict(stats["status"]),
+        "atualizadas_por_dia": dict(stats["atualizadas_por_dia"])
+    }
 
 
 class VerificationStorage:
+    """Verificações indexadas por user_id
 
-    def __init__(self, filename: str = "verificacao.json"):
+    Em memória os registros ficam em um dicionário {user_id: verificação}.
+    No disco, verificacao.json é o snapshot e verificacao.journal recebe uma
+    linha por registro alterado (upsert); o journal é consolidado no snapshot
+    quando passa de journal_max_bytes. As estatísticas são mantidas a cada
+    gravação e salvas no snapshot junto com os registros.
+    """
+
+    # Índice residente, compartilhado entre instâncias:
+    # {filename: {"stat": (...), "records": {user_id: verificação},
+    #             "stats": {...}, "ordem": [(timestamp, user_id), ...]}}
+    _cache: Dict[str, Dict[str, Any]] = {}
+
+    def __init__(self,
+                 filename: str = "verificacao.json",
+                 journal_max_bytes: int | None = None):
         self.filename = filename
+        self.journal_filename = os.path.splitext(filename)[0] + ".journal"
+        self.journal_max_bytes = journal_max_bytes or int(
+            os.getenv("VERIFICATION_JOURNAL_MAX_BYTES", 256 * 1024))
+        # Trava entre processos: leitores compartilham, quem grava é exclusivo
+        self._file_lock = get_file_lock(filename)
+        # Group commit: dentro de batch() as linhas do journal ficam pendentes
+        self._batch_depth = 0
+        self._pending: List[str] = []
         self.ensure_file_exists()
 
     def ensure_file_exists(self):
         """Garante que o arquivo JSON existe"""
-        if not os.path.exists(self.filename):
+        with self._file_lock.acquire(exclusive=True):
+            if os.path.exists(self.filename):
+                return
             with open(self.filename, 'w', encoding='utf-8') as f:
                 json.dump({"verificacoes": []},
                           f,
                           ensure_ascii=False,
                           indent=2)
 
-    def save_verification(self, user_data: Dict[str, Any]) -> bool:
-        """Salva dados de verificação de um usuário"""
-        try:
-            # Ler dados existentes
+    def _file_stat(self) -> Tuple:
+        """Identifica o estado do snapshot e do journal no disco"""
+        st = os.stat(self.filename)
+        stat = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if os.path.exists(self.journal_filename):
+            jst = os.stat(self.journal_filename)
+            stat += (jst.st_ino, jst.st_mtime_ns, jst.st_size)
+        return stat
+
+    def _load(self) -> Dict[Any, Dict[str, Any]]:
+        """Retorna o índice user_id -> verificação, relendo o disco se mudou"""
+        entry = VerificationStorage._cache.get(self.filename)
+        if self._pending and entry is not None:
+            # Linhas deste processo ainda não gravadas: o índice já foi
+            # validado no início do batch(), que mantém a trava exclusiva
+            return entry["records"]
+        with self._file_lock.acquire(exclusive=False):
+            stat = self._file_stat()
+            if entry is not None and entry["stat"] == stat:
+                return entry["records"]
             with open(self.filename, 'r', encoding='utf-8') as f:
                 data = json.load(f)
+            records = {
+                verification.get('user_id'): verification
+                for verification in data.get("verificacoes", [])
+            }
+            stats = data.get("estatisticas")
+            if stats and "por_dia" in stats:
+                # Contador por dia renomeado (conta a última atualização)
+                stats["atualizadas_por_dia"] = stats.pop("por_dia")
+            # Arquivos antigos não têm estatísticas (ou não têm todas):
+            # calcular uma vez
+            if not stats or set(stats) != set(empty_stats()):
+                stats = build_stats(records.values())
+            self._replay_journal(records, stats)
+            VerificationStorage._cache[self.filename] = {
+                "stat": self._file_stat(),
+                "records": records,
+                "stats": stats,
+                # Chaves de página em ordem crescente, para cursores com bisect
+                "ordem": sorted(page_key(v) for v in records.values())
+            }
+            return records
+
+    def _ordem(self) -> List[Tuple[str, Any]]:
+        """Chaves (timestamp, user_id) de todos os registros, em ordem"""
+        self._load()
+        return VerificationStorage._cache[self.filename]["ordem"]
 
-            # Verificar se usuário já existe
-            user_id = user_data.get('user_id')
-            existing_index = None
+    def _stats(self) -> Dict[str, Any]:
+        """Contadores correspondentes aos registros em memória"""
+        self._load()
+        return VerificationStorage._cache[self.filename]["stats"]
 
-            for i, verification in enumerate(data["verificacoes"]):
-                if verification.get('user_id') == user_id:
-                    existing_index = i
+    def _replay_journal(self, records: Dict[Any, Dict[str, Any]],
+                        stats: Dict[str, Any]):
+        """Aplica sobre o snapshot os registros gravados no journal"""
+        if not os.path.exists(self.journal_filename):
+            return
+        valido_ate = 0
+        with open(self.journal_filename, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    verification = json.loads(line.decode('utf-8'))
+                except (UnicodeDecodeError, json.JSONDecodeError):
                     break
+                user_id = verification.get('user_id')
+                apply_stats(stats, records.get(user_id), -1)
+                apply_stats(stats, verification, 1)
+                records[user_id] = verification
+                valido_ate += len(line)
+            incompleto = f.tell() != valido_ate
+        if incompleto:
+            # Gravação interrompida: só ignorar aqui (a leitura tem apenas a
+            # trava compartilhada); o próximo append descarta a linha
+            print("Entrada incompleta no journal de verificações ignorada")
+
+    def _append(self, linhas: List[str]):
+        """Anexa registros ao journal (um único fsync) e consolida se preciso"""
+        with self._file_lock.acquire(exclusive=True):
+            try:
+                with open(self.journal_filename, 'a+b') as f:
+                    if discard_incomplete_line(f):
+                        print("Entrada incompleta no journal de verificações "
+                              "descartada")
+                    f.write("".join(linhas).encode('utf-8'))
+                    f.flush()
+                    os.fsync(f.fileno())
+                if os.path.getsize(
+                        self.journal_filename) >= self.journal_max_bytes:
+                    self.compact_journal()
+                else:
+                    self._update_stat()
+            except Exception:
+                # Memória pode ter divergido do disco
+                VerificationStorage._cache.pop(self.filename, None)
+                raise
+
+    def _update_stat(self):
+        """Marca o índice em memória como igual ao disco"""
+        VerificationStorage._cache[self.filename]["stat"] = self._file_stat()
+
+    def compact_journal(self) -> bool:
+        """Regrava o snapshot com todos os registros e esvazia o journal"""
+        with self._file_lock.acquire(exclusive=True):
+            records = self._load()
+            atomic_write_json(
+                self.filename, {
+                    "verificacoes": list(records.values()),
+                    "estatisticas": self._stats()
+                },
+                indent=2)
+            open(self.journal_filename, 'w').close()
+            self._update_stat()
+            return True
+
+    @contextmanager
+    def batch(self):
+        """Agrupa várias operações em uma única gravação no disco"""
+        with self._file_lock.acquire(exclusive=True):
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if not self._batch_depth:
+                    linhas, self._pending = self._pending, []
+                    if linhas:
+                        self._append(linhas)
+
+    def save_verification(self, user_data: Dict[str, Any]) -> bool:
+        """Salva dados de verificação de um usuário"""
+        try:
+            with self._file_lock.acquire(exclusive=True):
+                records = self._load()
+                stats = self._stats()
+                ordem = self._ordem()
+
+                # Adicionar timestamp com horário de Brasília
+                brasilia_tz = pytz.timezone('America/Sao_Paulo')
+                now_brasilia = datetime.now(brasilia_tz)
+                user_data['data'] = now_brasilia.strftime(
+                    "%d/%m/%Y às %H:%M:%S (Brasília)")
+                user_data['timestamp'] = now_brasilia.isoformat()
+
+                # Atualizar ou adicionar (quem já existe mantém a posição);
+                # guarda uma cópia para que quem chamou não altere o índice
+                user_id = user_data['user_id'] = normalize_user_id(
+                    user_data.get('user_id'))
+                anterior = records.get(user_id)
+                if anterior is not None:
+                    apply_stats(stats, anterior, -1)
+                    ordem.pop(bisect.bisect_left(ordem, page_key(anterior)))
+                records[user_id] = dict(user_data)
+                apply_stats(stats, records[user_id], 1)
+                bisect.insort(ordem, page_key(records[user_id]))
+
+                linha = json.dumps(user_data,
+                                   ensure_ascii=False,
+                                   separators=(',', ':')) + "\n"
+                if self._batch_depth:
+                    self._pending.append(linha)
+                else:
+                    self._append([linha])
+
+            return True
+        except Exception as e:
+            print(f"Erro ao salvar verificação: {e}")
+            return False
+
+    def get_all_verifications(self) -> List[Dict[str, Any]]:
+        """Retorna todas as verificações salvas"""
+        try:
+            return [dict(v) for v in self._load().values()]
+        except Exception as e:
+            print(f"Erro ao carregar verificações: {e}")
+            return []
+
+    def get_verification_by_user(self, user_id: int) -> Dict[str, Any] | None:
+        """Busca verificação específica pelo ID do usuário"""
+        try:
+            verification = self._load().get(user_id)
+            return dict(verification) if verification else None
+        except Exception as e:
+            print(f"Erro ao buscar verificação: {e}")
+            return None
+
+    def count_verifications(self) -> int:
+        """Conta o total de verificações"""
+        try:
+            return self._stats()["total"]
+        except Exception as e:
+            print(f"Erro ao contar verificações: {e}")
+            return 0
+
+    def get_recent_verifications(self,
+                                 limit: int = 10) -> List[Dict[str, Any]]:
+        """Retorna as verificações mais recentes"""
+        try:
+            # Mais recentes primeiro, sem ordenar a lista inteira
+            recentes = heapq.nlargest(limit,
+                                      self._load().values(),
+                                      key=lambda x: x.get('timestamp', ''))
+            return [dict(v) for v in recentes]
+        except Exception as e:
+            print(f"Erro ao buscar verificações recentes: {e}")
+            return []
+
+    def get_verifications_page(self,
+                               limit: int = 10,
+                               cursor: List[Any] | None = None,
+                               direction: str = "next") -> Dict[str, Any]:
+        """Página de verificações (mais recentes primeiro) a partir de um cursor
+
+        cursor é a chave (timestamp, user_id) de um registro da página atual:
+        "next" traz os registros mais antigos que ele, "prev" os mais novos.
+        """
+        try:
+            records = self._load()
+            ordem = self._ordem()
+            chave = tuple(cursor) if cursor else None
+            if direction == "prev" and chave is not None:
+                inicio = bisect.bisect_right(ordem, chave)
+                fim = min(len(ordem), inicio + limit)
+            else:
+                fim = bisect.bisect_left(ordem,
+                                         chave) if chave else len(ordem)
+                inicio = max(0, fim - limit)
+            verificacoes = [
+                dict(records[user_id])
+                for _, user_id in reversed(ordem[inicio:fim])
+            ]
+            return self._page(verificacoes, fim < len(ordem), inicio > 0)
+        except Exception as e:
+            print(f"Erro ao buscar página de verificações: {e}")
+            return self._page([], False, False)
+
+    @staticmethod
+    def _page(verificacoes: List[Dict[str, Any]], tem_anterior: bool,
+              tem_proxima: bool) -> Dict[str, Any]:
+        """Monta o resultado de get_verifications_page com os cursores"""
+        return {
+            "verificacoes": verificacoes,
+            "tem_anterior": tem_anterior,
+            "tem_proxima": tem_proxima,
+            "cursor_inicio":
+            list(page_key(verificacoes[0])) if verificacoes else None,
+            "cursor_fim":
+            list(page_key(verificacoes[-1])) if verificacoes else None
+        }
+
+    def import_verifications(self,
+                             filename: str,
+                             formato: str | None = None) -> int:
+        """Importa verificações em massa (JSONL/CSV) com uma única gravação
 
-            # Adicionar timestamp com horário de Brasília
+        Os registros mantêm data e timestamp originais; quem já existe é
+        substituído. Retorna quantos registros foram importados.
+        """
+        with self._file_lock.acquire(exclusive=True):
+            records = self._load()
+            stats = self._stats()
+            total = 0
+            try:
+                for verification in iter_verification_file(filename, formato):
+                    user_id = verification.get('user_id')
+                    apply_stats(stats, records.get(user_id), -1)
+                    records[user_id] = verification
+                    apply_stats(stats, verification, 1)
+                    total += 1
+                VerificationStorage._cache[self.filename]["ordem"] = sorted(
+                    page_key(v) for v in records.values())
+                self.compact_journal()
+            except Exception:
+                # Memória pode ter divergido do disco
+                VerificationStorage._cache.pop(self.filename, None)
+                raise
+            return total
+
+    def export_verifications(self,
+                             filename: str,
+                             formato: str | None = None) -> int:
+        """Exporta todas as verificações para JSONL/CSV; retorna a quantidade"""
+        with self._file_lock.acquire(exclusive=False):
+            verificacoes = list(self._load().values())
+        atomic_write_bytes(
+            filename,
+            verification_file_chunks(verificacoes,
+                                     bulk_format(filename, formato)))
+        return len(verificacoes)
+
+    def get_verification_stats(self) -> Dict[str, Any]:
+        """Contadores mantidos a cada gravação (total, vocação, status, dia)"""
+        try:
+            return copy_stats(self._stats())
+        except Exception as e:
+            print(f"Erro ao carregar estatísticas de verificação: {e}")
+            return empty_stats()
+
+    def count_by_vocacao(self) -> Dict[str, int]:
+        """Conta as verificações por vocação"""
+        return self.get_verification_stats()["vocacao"]
+
+    def count_by_status(self) -> Dict[str, int]:
+        """Conta as verificações por status"""
+        return self.get_verification_stats()["status"]
+
+    def check_stats(self, repair: bool = True) -> bool:
+        """Confere os contadores recalculando do zero; corrige se divergirem"""
+        try:
+            with self._file_lock.acquire(exclusive=True):
+                stats = self._stats()
+                esperado = build_stats(self._load().values())
+                if esperado == stats:
+                    return True
+                print("Estatísticas de verificação inconsistentes" +
+                      (", recalculadas" if repair else ""))
+                if repair:
+                    stats.clear()
+                    stats.update(esperado)
+                    self.compact_journal()
+                return False
+        except Exception as e:
+            print(f"Erro ao conferir estatísticas de verificação: {e}")
+            return False
+
+
+class SQLiteVerificationStorage:
+    """Verificações em SQLite com índices por user_id, data, vocação e status"""
+
+    def __init__(self,
+                 filename: str = "verificacao.db",
+                 json_filename: str = "verificacao.json"):
+        self.filename = filename
+        self._lock = threading.RLock()
+        self._batch_depth = 0
+        self.conn = sqlite3.connect(filename,
+                                    timeout=FILE_LOCK_TIMEOUT,
+                                    isolation_level=None,
+                                    check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.ensure_schema()
+        self.import_from_json(json_filename)
+        # Bancos criados antes das estatísticas: calcular uma vez
+        with self._lock:
+            sem_stats = self.conn.execute(
+                "SELECT COUNT(*) FROM estatisticas").fetchone()[0] == 0
+        if sem_stats and self.count_verifications():
+            self.check_stats()
+
+    def ensure_schema(self):
+        """Cria as tabelas e os índices se ainda não existirem"""
+        with self._lock:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS verificacoes (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    timestamp TEXT,
+                    vocacao TEXT,
+                    status TEXT,
+                    dados TEXT NOT NULL
+                );
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_verificacoes_user_id
+                    ON verificacoes(user_id);
+                CREATE INDEX IF NOT EXISTS idx_verificacoes_timestamp
+                    ON verificacoes(timestamp);
+                CREATE INDEX IF NOT EXISTS idx_verificacoes_vocacao
+                    ON verificacoes(vocacao);
+                CREATE INDEX IF NOT EXISTS idx_verificacoes_status
+                    ON verificacoes(status);
+                -- Paginação por cursor (timestamp, user_id)
+                CREATE INDEX IF NOT EXISTS idx_verificacoes_pagina
+                    ON verificacoes(timestamp, user_id);
+                UPDATE verificacoes SET timestamp = ''
+                    WHERE timestamp IS NULL;
+
+                CREATE TABLE IF NOT EXISTS estatisticas (
+                    tipo TEXT NOT NULL,
+                    chave TEXT NOT NULL,
+                    total INTEGER NOT NULL,
+                    PRIMARY KEY (tipo, chave)
+                );
+                -- Contador por dia renomeado (conta a última atualização)
+                UPDATE estatisticas SET tipo = 'atualizadas_por_dia'
+                    WHERE tipo = 'por_dia';
+            """)
+
+    @contextmanager
+    def _transaction(self):
+        """Transação de uma operação; dentro de batch() vira um savepoint"""
+        if not self._batch_depth:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+            return
+        self.conn.execute("SAVEPOINT operacao")
+        try:
+            yield
+        except Exception:
+            self.conn.execute("ROLLBACK TO operacao")
+            self.conn.execute("RELEASE operacao")
+            raise
+        self.conn.execute("RELEASE operacao")
+
+    @contextmanager
+    def batch(self):
+        """Agrupa várias operações em um único commit"""
+        with self._lock:
+            # Lote aninhado vira um savepoint: falhas desfazem só ele
+            if not self._batch_depth:
+                self.conn.execute("BEGIN IMMEDIATE")
+            else:
+                self.conn.execute("SAVEPOINT lote")
+            self._batch_depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._batch_depth -= 1
+                if not self._batch_depth:
+                    self.conn.execute("ROLLBACK")
+                else:
+                    self.conn.execute("ROLLBACK TO lote")
+                    self.conn.execute("RELEASE lote")
+                raise
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self.conn.execute("COMMIT")
+            else:
+                self.conn.execute("RELEASE lote")
+
+    def import_from_json(self, json_filename: str):
+        """Importa as verificações do JSON (e journal) quando o banco está vazio"""
+        try:
+            if not os.path.exists(json_filename):
+                return
+            with self._lock, self._transaction():
+                total = self.conn.execute(
+                    "SELECT COUNT(*) FROM verificacoes").fetchone()[0]
+                if total:
+                    return
+                verificacoes = VerificationStorage(
+                    json_filename).get_all_verifications()
+                for verification in verificacoes:
+                    self._upsert(verification)
+            if verificacoes:
+                print(f"Migradas {len(verificacoes)} verificações de "
+                      f"{json_filename} para {self.filename}")
+        except Exception as e:
+            print(f"Erro ao importar verificações do JSON: {e}")
+
+    UPSERT_SQL = (
+        "INSERT INTO verificacoes (user_id, timestamp, vocacao, status, "
+        "dados) VALUES (?, ?, ?, ?, ?) ON CONFLICT(user_id) DO UPDATE SET "
+        "timestamp = excluded.timestamp, vocacao = excluded.vocacao, "
+        "status = excluded.status, dados = excluded.dados")
+
+    @staticmethod
+    def _upsert_params(user_data: Dict[str, Any]) -> Tuple:
+        return (user_data.get('user_id'), user_data.get('timestamp') or '',
+                user_data.get('vocacao'), user_data.get('status'),
+                json.dumps(user_data, ensure_ascii=False))
+
+    def _upsert(self, user_data: Dict[str, Any]):
+        """Insere ou substitui o registro do usuário (mantém a posição)"""
+        anterior = self.conn.execute(
+            "SELECT vocacao, status, timestamp FROM verificacoes "
+            "WHERE user_id = ?", (user_data.get('user_id'), )).fetchone()
+        if anterior is not None:
+            self._apply_stats(dict(anterior), -1)
+        self._apply_stats(user_data, 1)
+        self.conn.execute(self.UPSERT_SQL, self._upsert_params(user_data))
+
+    def save_verification(self, user_data: Dict[str, Any]) -> bool:
+        """Salva dados de verificação de um usuário"""
+        try:
             brasilia_tz = pytz.timezone('America/Sao_Paulo')
             now_brasilia = datetime.now(brasilia_tz)
             user_data['data'] = now_brasilia.strftime(
                 "%d/%m/%Y às %H:%M:%S (Brasília)")
             user_data['timestamp'] = now_brasilia.isoformat()
+            user_data['user_id'] = normalize_user_id(user_data.get('user_id'))
 
-            # Atualizar ou adicionar
-            if existing_index is not None:
-                data["verificacoes"][existing_index] = user_data
-            else:
-                data["verificacoes"].append(user_data)
-
-            # Salvar de volta
-            with open(self.filename, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-
+            with self._lock, self._transaction():
+                self._upsert(user_data)
             return True
         except Exception as e:
             print(f"Erro ao salvar verificação: {e}")
@@ -61,9 +734,10 @@ class VerificationStorage:
     def get_all_verifications(self) -> List[Dict[str, Any]]:
         """Retorna todas as verificações salvas"""
         try:
-            with open(self.filename, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            return data.get("verificacoes", [])
+            with self._lock:
+                rows = self.conn.execute(
+                    "SELECT dados FROM verificacoes ORDER BY seq").fetchall()
+            return [json.loads(row['dados']) for row in rows]
         except Exception as e:
             print(f"Erro ao carregar verificações: {e}")
             return []
@@ -71,14 +745,11 @@ class VerificationStorage:
     def get_verification_by_user(self, user_id: int) -> Dict[str, Any] | None:
         """Busca verificação específica pelo ID do usuário"""
         try:
-            with open(self.filename, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-
-            for verification in data.get("verificacoes", []):
-                if verification.get("user_id") == user_id:
-                    return verification
-
-            return None
+            with self._lock:
+                row = self.conn.execute(
+                    "SELECT dados FROM verificacoes WHERE user_id = ?",
+                    (user_id, )).fetchone()
+            return json.loads(row['dados']) if row else None
         except Exception as e:
             print(f"Erro ao buscar verificação: {e}")
             return None
@@ -86,22 +757,192 @@ class VerificationStorage:
     def count_verifications(self) -> int:
         """Conta o total de verificações"""
         try:
-            verifications = self.get_all_verifications()
-            return len(verifications)
+            with self._lock:
+                return self.conn.execute(
+                    "SELECT COUNT(*) FROM verificacoes").fetchone()[0]
         except Exception as e:
             print(f"Erro ao contar verificações: {e}")
             return 0
 
     def get_recent_verifications(self,
                                  limit: int = 10) -> List[Dict[str, Any]]:
-        """Retorna as verificações mais recentes"""
+        """Retorna as verificações mais recentes (pelo índice de timestamp)"""
         try:
-            all_verifications = self.get_all_verifications()
-            # Ordenar por timestamp (mais recente primeiro)
-            sorted_verifications = sorted(all_verifications,
-                                          key=lambda x: x.get('timestamp', ''),
-                                          reverse=True)
-            return sorted_verifications[:limit]
+            with self._lock:
+                rows = self.conn.execute(
+                    "SELECT dados FROM verificacoes "
+                    "ORDER BY timestamp DESC LIMIT ?", (limit, )).fetchall()
+            return [json.loads(row['dados']) for row in rows]
         except Exception as e:
             print(f"Erro ao buscar verificações recentes: {e}")
-            return []
\ No newline at end of file
+            return []
+
+    def get_verifications_page(self,
+                               limit: int = 10,
+                               cursor: List[Any] | None = None,
+                               direction: str = "next") -> Dict[str, Any]:
+        """Página de verificações (mais recentes primeiro) a partir de um cursor
+
+        Consulta por keyset no índice (timestamp, user_id): cada página lê
+        só as suas linhas, independente do tamanho da tabela.
+        """
+        try:
+            with self._lock:
+                if direction == "prev" and cursor:
+                    rows = self.conn.execute(
+                        "SELECT dados FROM verificacoes "
+                        "WHERE (timestamp, user_id) > (?, ?) "
+                        "ORDER BY timestamp, user_id LIMIT ?",
+                        (cursor[0], cursor[1], limit + 1)).fetchall()
+                    tem_anterior = len(rows) > limit
+                    rows = rows[:limit][::-1]
+                    tem_proxima = True
+                else:
+                    filtro, params = "", ()
+                    if cursor:
+                        filtro = "WHERE (timestamp, user_id) < (?, ?) "
+                        params = (cursor[0], cursor[1])
+                    rows = self.conn.execute(
+                        "SELECT dados FROM verificacoes " + filtro +
+                        "ORDER BY timestamp DESC, user_id DESC LIMIT ?",
+                        params + (limit + 1, )).fetchall()
+                    tem_proxima = len(rows) > limit
+                    rows = rows[:limit]
+                    tem_anterior = bool(cursor)
+            return VerificationStorage._page(
+                [json.loads(row['dados']) for row in rows], tem_anterior,
+                tem_proxima)
+        except Exception as e:
+            print(f"Erro ao buscar página de verificações: {e}")
+            return VerificationStorage._page([], False, False)
+
+    def import_verifications(self,
+                             filename: str,
+                             formato: str | None = None) -> int:
+        """Importa verificações em massa (JSONL/CSV) em uma única transação
+
+        As estatísticas são recalculadas uma vez no fim, na mesma transação.
+        """
+        total = 0
+        bloco: List[Tuple] = []
+        with self._lock, self.batch():
+            for verification in iter_verification_file(filename, formato):
+                bloco.append(self._upsert_params(verification))
+                if len(bloco) == 1000:
+                    self.conn.executemany(self.UPSERT_SQL, bloco)
+                    total += len(bloco)
+                    bloco = []
+            self.conn.executemany(self.UPSERT_SQL, bloco)
+            total += len(bloco)
+            self._write_stats(self._count_stats())
+        return total
+
+    def export_verifications(self,
+                             filename: str,
+                             formato: str | None = None) -> int:
+        """Exporta todas as verificações para JSONL/CSV; retorna a quantidade"""
+        total = 0
+
+        def registros():
+            nonlocal total
+            with self._lock:
+                for row in self.conn.execute(
+                        "SELECT dados FROM verificacoes ORDER BY seq"):
+                    total += 1
+                    yield json.loads(row['dados'])
+
+        atomic_write_bytes(
+            filename,
+            verification_file_chunks(registros(),
+                                     bulk_format(filename, formato)))
+        return total
+
+    def _apply_stats(self, verification: Dict[str, Any], delta: int):
+        """Atualiza as linhas de contadores (dentro de uma transação)"""
+        chaves = [('total', '')] + stats_keys(verification)
+        self.conn.executemany(
+            "INSERT INTO estatisticas (tipo, chave, total) VALUES (?, ?, ?) "
+            "ON CONFLICT(tipo, chave) DO UPDATE SET total = total + ?",
+            [(tipo, chave, delta, delta) for tipo, chave in chaves])
+        if delta < 0:
+            self.conn.execute("DELETE FROM estatisticas WHERE total = 0")
+
+    def get_verification_stats(self) -> Dict[str, Any]:
+        """Contadores mantidos a cada gravação (total, vocação, status, dia)"""
+        try:
+            with self._lock:
+                rows = self.conn.execute(
+                    "SELECT tipo, chave, total FROM estatisticas").fetchall()
+            stats = empty_stats()
+            for tipo, chave, total in rows:
+                if tipo == 'total':
+                    stats["total"] = total
+                else:
+                    stats[tipo][chave] = total
+            return stats
+        except Exception as e:
+            print(f"Erro ao carregar estatísticas de verificação: {e}")
+            return empty_stats()
+
+    def count_by_vocacao(self) -> Dict[str, int]:
+        """Conta as verificações por vocação"""
+        return self.get_verification_stats()["vocacao"]
+
+    def count_by_status(self) -> Dict[str, int]:
+        """Conta as verificações por status"""
+        return self.get_verification_stats()["status"]
+
+    def check_stats(self, repair: bool = True) -> bool:
+        """Confere os contadores recalculando do zero; corrige se divergirem"""
+        try:
+            with self._lock, self._transaction():
+                esperado = self._count_stats()
+                if esperado == self.get_verification_stats():
+                    return True
+                print("Estatísticas de verificação inconsistentes" +
+                      (", recalculadas" if repair else ""))
+                if repair:
+                    self._write_stats(esperado)
+                return False
+        except Exception as e:
+            print(f"Erro ao conferir estatísticas de verificação: {e}")
+            return False
+
+    def _count_stats(self) -> Dict[str, Any]:
+        """Recalcula os contadores a partir das colunas da tabela"""
+        rows = self.conn.execute(
+            "SELECT vocacao, status, timestamp FROM verificacoes").fetchall()
+        return build_stats(dict(row) for row in rows)
+
+    def _write_stats(self, stats: Dict[str, Any]):
+        """Substitui as linhas de contadores (dentro de uma transação)"""
+        self.conn.execute("DELETE FROM estatisticas")
+        linhas = [('total', '', stats["total"])]
+        for tipo in ('vocacao', 'status', 'atualizadas_por_dia'):
+            linhas += [(tipo, chave, total)
+                       for chave, total in stats[tipo].items()]
+        self.conn.executemany(
+            "INSERT INTO estatisticas (tipo, chave, total) VALUES (?, ?, ?)",
+            linhas)
+
+
+# Instâncias compartilhadas por backend (ver get_verification_storage)
+_verification_storages: Dict[str, Any] = {}
+
+
+def get_verification_storage():
+    """Retorna o armazenamento de verificações configurado
+
+    O backend é escolhido pela variável de ambiente
+    VERIFICATION_STORAGE_BACKEND ("json", padrão, ou "sqlite"); o caminho do
+    banco SQLite vem de VERIFICATION_STORAGE_DB (padrão: verificacao.db).
+    """
+    backend = os.getenv("VERIFICATION_STORAGE_BACKEND",
+                        "json").strip().lower()
+    if backend not in _verification_storages:
+        if backend == "sqlite":
+            _verification_storages[backend] = SQLiteVerificationStorage(
+                os.getenv("VERIFICATION_STORAGE_DB", "verificacao.db"))
+        else:
+            _verification_storages[backend] = VerificationStorage()
+    return _verification_storages[backend]
\ No newline at end of file